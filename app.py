@@ -1,15 +1,21 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify
 from datetime import datetime
-import requests
 import pandas as pd
-import pymysql
-import configparser
-import plotly.graph_objects as go
-from plotly.io import to_html
 import calendar
+import gzip
+import hashlib
+import json
+import math
 from flask_mwoauth import MWOAuth
 import os
 
+from db import DEFAULT_POOL_SIZE, ConnectionPool
+from edit_metrics import METRIC_COLUMNS, METRICS_TABLE
+from global_events import load_events
+from peak_detection import DEFAULT_THRESHOLD
+from sitematrix import SiteMatrixCache
+import snapshot
+
 app = Flask(__name__)
 
 app.secret_key = os.getenv("SECRET_KEY")
@@ -20,226 +26,285 @@ mwo_auth = MWOAuth(
 )
 app.register_blueprint(mwo_auth.bp)
 base_url=os.getenv("BASE_URL")
+sitematrix_cache = SiteMatrixCache()
 
 
-# --- DB connection setup ---
-def get_db_connection():
-    cfg = configparser.ConfigParser()
-    cfg.read("/data/project/community-activity-alerts-system/replica.my.cnf")
-    user = cfg["client"]["user"]
-    password = cfg["client"]["password"]
+# --- DB connection pool (credentials are read once, at startup) ---
+db_pool = ConnectionPool(max_size=int(os.getenv("DB_POOL_SIZE", DEFAULT_POOL_SIZE)))
 
-    conn = pymysql.connect(
-        host="tools.db.svc.wikimedia.cloud",
-        user=user,
-        password=password,
-        database="s56391__community_alerts",
-        charset="utf8mb4",
-    )
-    return conn
+# Chart data from the database ("db") or the local Parquet snapshot ("snapshot")
+STATS_SOURCE = os.getenv("STATS_SOURCE", "db")
 
+# Extra series the chart can switch between (edit_count is already `edits`)
+SERIES_METRICS = [column for column in METRIC_COLUMNS if column != "edit_count"]
 
-# --- Get communities list from SiteMatrix API ---
-def get_all_communities():
-    url = "https://commons.wikimedia.org/w/api.php?action=sitematrix&smtype=language&format=json"
-    headers = {
-        "User-Agent": "Community Activity Alerts (https://github.com/indictechcom/community-activity-alerts)",
-        "tool": "Community Activity Alerts",
-        "url": "https://github.com/indictechcom/community-activity-alerts",
-        "email": "tools.community-activity-alerts-system@toolforge.org",
-    }
-
-    response = requests.get(url, headers=headers)
-    data = response.json()
-    sitematrix = data["sitematrix"]
-
-    languages = {}
-    for key, value in sitematrix.items():
-        if key.isdigit() and "localname" in value:
-            communities = [
-                {"sitename": site["code"], "url": site["url"]}
-                for site in value.get("site", [])
-            ]
-            languages[value["localname"]] = communities
-
-    return languages
-
-
-# --- Peak detection function ---
-def find_peaks_rolling_3_years(df, threshold_percentage=0.30):
-    df = df.sort_values("timestamp").reset_index(drop=True)
-    peaks = []
-
-    for i in range(len(df)):
-        t_i = df.at[i, "timestamp"]
-        edits_i = df.at[i, "edits"]
-
-        window = df[
-            (df["timestamp"] >= t_i - pd.DateOffset(years=3)) & (df["timestamp"] <= t_i)
-        ]
-        if window.empty:
-            continue
-
-        rolling_mean = window["edits"].mean()
-        threshold = rolling_mean * (1 + threshold_percentage)
-        pct_diff = ((edits_i - rolling_mean) / rolling_mean) * 100
-
-        if edits_i >= threshold:
-            peaks.append(
-                {
-                    "timestamp": t_i,
-                    "edits": edits_i,
-                    "rolling_mean": rolling_mean,
-                    "threshold": threshold,
-                    "percentage_difference": pct_diff,
-                }
-            )
 
-    return peaks
+# --- Get communities list from the cached SiteMatrix ---
+def get_all_communities():
+    return sitematrix_cache.languages()
 
 
-# --- Format peaks for display ---
-def log_peaks(peaks):
-    peaks_list = []
-    for peak in peaks:
-        peaks_list.append(
+# --- Labels of every alert in a range, in one query ---
+def get_peak_labels(conn, project, start, end):
+    """Return {"YYYY-MM-DD": label} for the labelled alerts of a project and range."""
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT timestamp, label
+                FROM community_alerts
+                WHERE project = %s
+                  AND timestamp BETWEEN %s AND %s
+                  AND label IS NOT NULL AND label <> ''
+                """,
+                (project, start, end),
+            )
+            return {
+                timestamp.strftime("%Y-%m-%d"): label
+                for timestamp, label in cursor.fetchall()
+            }
+    except Exception:
+        return {}
+
+
+# --- Date range from query parameters ---
+def parse_range(args):
+    """Optional `start`/`end` ("YYYY-MM") as the first and last second of the range."""
+    start = end = None
+    if args.get("start"):
+        start = datetime.strptime(args["start"], "%Y-%m")
+    if args.get("end"):
+        end = datetime.strptime(args["end"], "%Y-%m")
+        last_day = calendar.monthrange(end.year, end.month)[1]
+        end = end.replace(day=last_day, hour=23, minute=59, second=59)
+    return start or datetime(1970, 1, 1), end or datetime(9999, 12, 31)
+
+
+def parse_threshold(args):
+    """Optional `threshold` in percent over the rolling mean, as a fraction."""
+    if not args.get("threshold"):
+        return DEFAULT_THRESHOLD
+    percent = float(args["threshold"])
+    if not math.isfinite(percent) or percent < 0:
+        raise ValueError(percent)
+    return percent / 100
+
+
+def load_stats(conn, project, start, end, min_score=None, metrics=False):
+    """
+    Precomputed series and rolling statistics (written by community_alerts.py)
+    for a project and range, in one primary-key range read. With `min_score`,
+    only the points whose edits are at least that multiple of the rolling
+    mean are returned. With `metrics`, the SERIES_METRICS columns of
+    edit_metrics are joined in (NULL where they were not fetched).
+    """
+    metric_columns = join = ""
+    if metrics:
+        metric_columns = "".join(f", m.{column}" for column in SERIES_METRICS)
+        join = (
+            f"LEFT JOIN {METRICS_TABLE} m "
+            "ON m.project = s.project AND m.timestamp = s.timestamp"
+        )
+    query = f"""
+        SELECT s.timestamp, s.edit_count AS edits, s.rolling_mean,
+               s.percentage_difference{metric_columns}
+        FROM edit_stats s
+        {join}
+        WHERE s.project = %s
+          AND s.timestamp BETWEEN %s AND %s
+          {"AND s.score >= %s" if min_score is not None else ""}
+        ORDER BY s.timestamp ASC
+    """
+    params = (project, start, end)
+    if min_score is not None:
+        params += (min_score,)
+    df = pd.read_sql(query, conn, params=params)
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    return df
+
+
+def load_stats_snapshot(project, start, end, min_score=None, metrics=False):
+    """Same as `load_stats`, from the project's memory-mapped snapshot partitions."""
+    columns = ["timestamp", "edit_count", "rolling_mean", "percentage_difference"]
+    table = snapshot.read_project("edit_stats", project, columns + ["score"])
+    if table is None:
+        df = pd.DataFrame(
             {
-                "timestamp": peak["timestamp"].strftime("%Y-%m-%d"),
-                "edits": int(peak["edits"]),
-                "rolling_mean": round(float(peak["rolling_mean"]), 2),
-                "threshold": round(float(peak["threshold"]), 2),
-                "percentage_difference": round(float(peak["percentage_difference"]), 2),
+                "timestamp": pd.Series(dtype="datetime64[ns]"),
+                "edits": pd.Series(dtype="int64"),
+                "rolling_mean": pd.Series(dtype="float64"),
+                "percentage_difference": pd.Series(dtype="float64"),
             }
         )
-    return peaks_list
+        if metrics:
+            df[SERIES_METRICS] = None
+        return df
+    df = table.to_pandas()
+    df["timestamp"] = df["timestamp"].dt.tz_convert(None)
+    keep = (df["timestamp"] >= start) & (df["timestamp"] <= end)
+    if min_score is not None:
+        keep &= df["score"] >= min_score
+    df = df[keep].rename(columns={"edit_count": "edits"})
+    df = df[["timestamp", "edits"] + columns[2:]].reset_index(drop=True)
+    if metrics:
+        extra = snapshot.read_project(
+            METRICS_TABLE, project, ["timestamp"] + SERIES_METRICS
+        )
+        if extra is None:
+            df[SERIES_METRICS] = None
+        else:
+            extra = extra.to_pandas()
+            extra["timestamp"] = extra["timestamp"].dt.tz_convert(None)
+            df = df.merge(extra, on="timestamp", how="left")
+    return df
+
+
+def nullable_ints(series):
+    return [None if pd.isna(value) else int(value) for value in series]
+
+
+# --- Compact, cacheable JSON responses ---
+def columnar_response(payload):
+    """
+    Serialize `payload` compactly, tag it with an ETag of its content and
+    gzip it for clients that accept it. Requests whose If-None-Match matches
+    get an empty 304.
+    """
+    body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    response = Response(body, mimetype="application/json")
+    response.set_etag(hashlib.sha1(body).hexdigest(), weak=True)
+    response.headers["Cache-Control"] = "public, max-age=300"
+    response.vary.add("Accept-Encoding")
+    response = response.make_conditional(request)
+
+    if response.status_code == 200 and "gzip" in request.accept_encodings:
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers["Content-Encoding"] = "gzip"
+    return response
 
 
 # --- Main route ---
 @app.route("/")
 def index():
-    language = request.args.get("language")
-    project_group = request.args.get("project_group")
-    datestart = request.args.get("datestart")
-    dateend = request.args.get("dateend")
-    filter_edits = request.args.get("filter_edits") == "true"
-    filter_users = request.args.get("filter_users") == "true"
-
-    if not (language and project_group and datestart and dateend):
-        return render_template(
-            "index.html",
-            languages=get_all_communities(),
-            user=mwo_auth.get_current_user(True),
-            base_url=base_url
-        )
+    # The chart and peaks table are rendered in the browser from /api/series
+    # and /api/peaks, so the page itself never touches the database.
+    return render_template(
+        "index.html",
+        languages=get_all_communities(),
+        user=mwo_auth.get_current_user(True),
+        base_url=base_url
+    )
 
-    project = project_group.split(":/")[1][1:]  # e.g. "en.wikipedia.org"
-    start = datetime.strptime(datestart, "%b %Y")
-    end = datetime.strptime(dateend, "%b %Y")
-    # Set start to first day, end to last day of month
-    start = start.replace(day=1, hour=0, minute=0, second=0)
-    last_day = calendar.monthrange(end.year, end.month)[1]
-    end = end.replace(day=last_day, hour=23, minute=59, second=59)
 
+# --- Edit count series for a project, as columns ---
+@app.route("/api/series")
+def api_series():
+    project = request.args.get("project")
+    if not project:
+        return jsonify({"error": "project is required"}), 400
     try:
-        conn = get_db_connection()
-        query = """
-            SELECT timestamp, edit_count AS edits
-            FROM edit_counts
-            WHERE project = %s
-              AND timestamp BETWEEN %s AND %s
-            ORDER BY timestamp ASC
-        """
-        df = pd.read_sql(query, conn, params=(project, start, end))
-        conn.close()
-
-        if df.empty:
-            return render_template(
-                "index.html",
-                languages=get_all_communities(),
-                data=[],
-                chart=None,
-                message="No data available.",
-                user = mwo_auth.get_current_user(),
-                base_url=base_url
-            )
-
-        df["timestamp"] = pd.to_datetime(df["timestamp"])
-        peaks_raw = find_peaks_rolling_3_years(df, threshold_percentage=0.30)
-        peaks = log_peaks(peaks_raw)
+        start, end = parse_range(request.args)
+    except ValueError:
+        return jsonify({"error": "start and end must be YYYY-MM"}), 400
 
-        # --- Fetch labels for peaks ---
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        peak_labels = {}
+    try:
+        if STATS_SOURCE == "snapshot":
+            df = load_stats_snapshot(project, start, end, metrics=True)
+        else:
+            with db_pool.connection() as conn:
+                df = load_stats(conn, project, start, end, metrics=True)
+    except Exception as e:
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+
+    # Every dimension comes along, so the chart's filters never refetch
+    return columnar_response(
+        {
+            "project": project,
+            "timestamp": df["timestamp"].dt.strftime("%Y-%m-%d").tolist(),
+            "edits": df["edits"].astype(int).tolist(),
+            **{column: nullable_ints(df[column]) for column in SERIES_METRICS},
+        }
+    )
 
-        for peak in peaks:
-            try:
-                cursor.execute(
-                    "SELECT label FROM community_alerts WHERE project = %s AND timestamp = %s",
-                    (project, peak["timestamp"]),
-                )
-                result = cursor.fetchone()
-                peak_labels[peak["timestamp"]] = (
-                    result[0] if result and result[0] else ""
-                )
-            except:
-                peak_labels[peak["timestamp"]] = ""
-
-        conn.close()
-
-        # --- Generate plot ---
-        fig = go.Figure()
-        fig.add_trace(
-            go.Scatter(
-                x=df["timestamp"],
-                y=df["edits"],
-                mode="lines+markers",
-                name="Edits",
-                line=dict(color="blue"),
-            )
-        )
 
-        peak_timestamps = [peak["timestamp"] for peak in peaks]
-        peak_values = [peak["edits"] for peak in peaks]
-        peak_labels_list = [peak_labels.get(peak["timestamp"], "") for peak in peaks]
-
-        fig.add_trace(
-            go.Scatter(
-                x=peak_timestamps,
-                y=peak_values,
-                mode="markers+text",
-                name="Peaks Above Threshold",
-                marker=dict(color="red", size=10, symbol="circle"),
-                text=peak_labels_list,
-                textposition="top center",
-                customdata=[
-                    {"project": project, "timestamp": peak["timestamp"]}
-                    for peak in peaks
-                ],
-                hovertemplate="<b>Peak</b><br>Date: %{x}<br>Edits: %{y}<br>",
-            )
-        )
+# --- Peaks (`threshold`% over 3-year rolling mean) for a project, as columns ---
+@app.route("/api/peaks")
+def api_peaks():
+    project = request.args.get("project")
+    if not project:
+        return jsonify({"error": "project is required"}), 400
+    try:
+        start, end = parse_range(request.args)
+    except ValueError:
+        return jsonify({"error": "start and end must be YYYY-MM"}), 400
+    try:
+        threshold = parse_threshold(request.args)
+    except ValueError:
+        message = "threshold must be a number of percent, 0 or more (e.g. 30)"
+        return jsonify({"error": message}), 400
 
-        fig.update_layout(
-            title="Edits count over time with peaks (30% over 3-year rolling mean)",
-            xaxis_title="Timestamp",
-            yaxis_title="Count (Edits)",
-            xaxis=dict(tickformat="%Y-%m-%d", tickangle=45),
-            showlegend=True,
-        )
+    try:
+        if STATS_SOURCE == "snapshot":
+            peaks = load_stats_snapshot(project, start, end, min_score=1 + threshold)
+        with db_pool.connection() as conn:
+            if STATS_SOURCE != "snapshot":
+                peaks = load_stats(conn, project, start, end, min_score=1 + threshold)
+            # Labels are edited live, so they always come from the database
+            peak_labels = get_peak_labels(conn, project, start, end)
+    except Exception as e:
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+
+    timestamps = peaks["timestamp"].dt.strftime("%Y-%m-%d").tolist()
+
+    return columnar_response(
+        {
+            "project": project,
+            "threshold_percentage": round(threshold * 100, 2),
+            "timestamp": timestamps,
+            "edits": peaks["edits"].astype(int).tolist(),
+            "rolling_mean": peaks["rolling_mean"].round(2).tolist(),
+            "threshold": (peaks["rolling_mean"] * (1 + threshold)).round(2).tolist(),
+            "percentage_difference": peaks["percentage_difference"].round(2).tolist(),
+            "label": [peak_labels.get(ts, "") for ts in timestamps],
+        }
+    )
 
-        chart_html = to_html(fig, full_html=False, include_plotlyjs="cdn")
 
-        return render_template(
-            "index.html", 
-            languages=get_all_communities(), 
-            data=peaks, chart=chart_html, 
-            user = mwo_auth.get_current_user(), 
-            base_url=base_url
-        )
+# --- Months in which many projects peaked together, as columns ---
+@app.route("/api/events")
+def api_events():
+    """
+    Global events (written by global_events.py) in the range; with
+    `project`, only the events that project took part in.
+    """
+    project = request.args.get("project")
+    try:
+        start, end = parse_range(request.args)
+    except ValueError:
+        return jsonify({"error": "start and end must be YYYY-MM"}), 400
 
+    try:
+        with db_pool.connection() as conn:
+            events = load_events(conn, start, end)
     except Exception as e:
-        return f"Database error: {str(e)}"
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+
+    if project:
+        events = events[events["projects"].map(lambda projects: project in projects)]
+
+    return columnar_response(
+        {
+            "project": project,
+            "month": pd.to_datetime(events["month"]).dt.strftime("%Y-%m-%d").tolist(),
+            "peak_count": events["peak_count"].astype(int).tolist(),
+            "project_count": events["project_count"].astype(int).tolist(),
+            "expected": events["expected"].round(2).tolist(),
+            "z_score": events["z_score"].round(2).tolist(),
+            "mean_score": events["mean_score"].round(2).tolist(),
+            "families": events["families"].tolist(),
+            "projects": events["projects"].tolist(),
+        }
+    )
 
 
 # --- Optional community name search endpoint ---
@@ -263,24 +328,22 @@ def update_peak_label():
     timestamp = data["timestamp"]
     label = data["label"]
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
     if mwo_auth.get_current_user(True):
         try:
-            cursor.execute(
-                """
-                UPDATE community_alerts 
-                SET label = %s 
-                WHERE project = %s AND timestamp = %s
-            """,
-                (label, project, timestamp),
-            )
-            conn.commit()
+            with db_pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    UPDATE community_alerts 
+                    SET label = %s 
+                    WHERE project = %s AND timestamp = %s
+                """,
+                    (label, project, timestamp),
+                )
+                conn.commit()
             return jsonify({"success": True})
         except Exception as e:
             return jsonify({"success": False, "error": str(e)})
-        finally:
-            conn.close()
     else:
         return jsonify({"error": "please login first"})
 
@@ -291,21 +354,18 @@ def get_peak_label():
     project = request.args.get("project")
     timestamp = request.args.get("timestamp")
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
     try:
-        cursor.execute(
-            "SELECT label FROM community_alerts WHERE project = %s AND timestamp = %s",
-            (project, timestamp),
-        )
-        result = cursor.fetchone()
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT label FROM community_alerts WHERE project = %s AND timestamp = %s",
+                (project, timestamp),
+            )
+            result = cursor.fetchone()
         label = result[0] if result else ""
         return jsonify({"label": label})
     except Exception as e:
         return jsonify({"error": str(e)})
-    finally:
-        conn.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+from urllib.parse import quote
+
+import connectorx as cx
+import pyarrow as pa
+
+from db import DB_HOST, DB_NAME, load_credentials
+
+DEFAULT_PARTITIONS = 4
+TIMESTAMP_COLUMNS = ("timestamp", "last_timestamp")
+
+
+# --- Connection string ---
+def mysql_uri(user=None, password=None, host=DB_HOST, database=DB_NAME, port=3306):
+    if user is None:
+        user, password = load_credentials()
+    return f"mysql://{quote(user, safe='')}:{quote(password, safe='')}@{host}:{port}/{database}"
+
+
+# --- Partitioning ---
+def partitioned_queries(query, partitions=DEFAULT_PARTITIONS):
+    """
+    Split `query` into one query per partition of its `project` column, so
+    connectorx can run them on separate connections. All rows of a project
+    land in the same partition.
+    """
+    if partitions <= 1:
+        return [query]
+    return [
+        f"SELECT * FROM ({query}) AS part "
+        f"WHERE CRC32(part.project) % {partitions} = {i}"
+        for i in range(partitions)
+    ]
+
+
+# --- Loading ---
+def normalize(table):
+    """
+    UTC timestamps, and projects dictionary-encoded: every project name is
+    stored once, and converts to a pandas categorical / Polars categorical
+    instead of one Python string per row.
+    """
+    for name in TIMESTAMP_COLUMNS:
+        if name in table.column_names:
+            index = table.column_names.index(name)
+            # DATETIME is naive UTC; going through a naive timestamp also
+            # covers drivers that return it as text or as a date
+            column = (
+                table.column(name)
+                .cast(pa.timestamp("us"))
+                .cast(pa.timestamp("us", tz="UTC"))
+            )
+            table = table.set_column(index, name, column)
+    if "project" in table.column_names:
+        index = table.column_names.index("project")
+        column = table.column("project")
+        if not pa.types.is_dictionary(column.type):
+            table = table.set_column(index, "project", column.dictionary_encode())
+    return table
+
+
+def load_arrow(query, uri=None, partitions=DEFAULT_PARTITIONS):
+    """
+    Run `query` through connectorx straight into an Arrow table (one record
+    batch per partition), without building per-row Python objects.
+    """
+    table = cx.read_sql(
+        uri or mysql_uri(), partitioned_queries(query, partitions), return_type="arrow"
+    )
+    return normalize(table)
+
+
+def to_pandas(table):
+    # split_blocks/self_destruct let Arrow hand its buffers to pandas instead
+    # of holding both copies at once
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def to_polars(table):
+    import polars as pl
+
+    return pl.from_arrow(table)
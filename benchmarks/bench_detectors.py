@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Benchmark and parity check of the peak detectors.
+
+Generates synthetic edit count series, times every detector on them in a
+fresh process, and diffs each detector's peak set against the production
+pandas detector (`peak_detection.find_peaks_all_projects`).
+
+    python -m benchmarks.bench_detectors --projects 1000 --years 25
+    python -m benchmarks.bench_detectors --projects 10000 --granularity daily --years 5
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+# --- Setup logging ---
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+REFERENCE_ENGINE = "pandas_batched"
+FREQUENCIES = {"monthly": "MS", "daily": "D"}
+
+
+# --- Synthetic data ---
+def generate_series(projects=1000, years=25, granularity="monthly", seed=0):
+    """
+    Edit counts shaped like the real table: projects start at different
+    times, sizes span several orders of magnitude, activity has seasonality
+    and a slow trend, a few points spike and some projects go dormant.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(
+        end=pd.Timestamp("2025-12-01", tz="UTC"),
+        periods=years * (12 if granularity == "monthly" else 365),
+        freq=FREQUENCIES[granularity],
+    )
+    periods = len(dates)
+
+    starts = (rng.random(projects) ** 2 * 0.6 * periods).astype(np.int64)
+    lengths = periods - starts
+    project_index = np.repeat(np.arange(projects), lengths)
+    position = np.arange(lengths.sum()) - np.repeat(
+        np.cumsum(lengths) - lengths, lengths
+    )
+    date_index = starts[project_index] + position
+
+    level = rng.lognormal(mean=4.0, sigma=1.8, size=projects)
+    trend = rng.normal(0.0, 0.5, size=projects)
+    phase = rng.uniform(0, 2 * np.pi, size=projects)
+    progress = position / np.maximum(lengths[project_index] - 1, 1)
+    season = 1 + 0.2 * np.sin(
+        2 * np.pi * dates.month.to_numpy()[date_index] / 12 + phase[project_index]
+    )
+    rate = level[project_index] * np.exp(trend[project_index] * progress) * season
+
+    spikes = rng.random(len(rate)) < 0.02
+    rate[spikes] *= rng.uniform(1.5, 5.0, size=spikes.sum())
+    # A tenth of the projects fall silent for their last fifth
+    dormant = rng.random(projects) < 0.1
+    rate[dormant[project_index] & (progress > 0.8)] = 0
+
+    return pd.DataFrame(
+        {
+            "project": np.char.add("p", np.arange(projects).astype(str))[project_index],
+            "timestamp": dates[date_index],
+            "edit_count": rng.poisson(rate).astype(np.int64),
+        }
+    )
+
+
+# --- Engines ---
+# Each engine is (prepare, detect): `prepare` converts the shared pandas frame
+# to the engine's input outside the timed region, `detect` returns the peaks
+# as a frame of (project, timestamp).
+def _prepare_polars(df):
+    import polars as pl
+
+    return pl.from_pandas(df)
+
+
+def _polars_peaks_per_project(df, detector):
+    rows = []
+    for key, group in df.group_by("project", maintain_order=True):
+        project = key[0] if isinstance(key, tuple) else key
+        rows.extend((project, peak["timestamp"]) for peak in detector(group))
+    return pd.DataFrame(rows, columns=["project", "timestamp"])
+
+
+def _pandas_batched(df):
+    from peak_detection import find_peaks_all_projects
+
+    return find_peaks_all_projects(df)[["project", "timestamp"]]
+
+
+def _pandas_per_project(df):
+    from peak_detection import find_peaks_rolling_3_years
+
+    rows = []
+    for project, group in df.groupby("project", sort=False):
+        rows.extend(
+            (project, peak["timestamp"]) for peak in find_peaks_rolling_3_years(group)
+        )
+    return pd.DataFrame(rows, columns=["project", "timestamp"])
+
+
+def _duckdb(df):
+    from duckdb_engine import rolling_3_year_stats_duckdb
+
+    stats = rolling_3_year_stats_duckdb(df)
+    return stats.loc[
+        stats["edit_count"] >= stats["threshold"], ["project", "timestamp"]
+    ]
+
+
+def _polars_optimized(df):
+    from polars_migration.community_alerts_polars import (
+        find_peaks_rolling_3_years_polars_optimized,
+    )
+
+    return _polars_peaks_per_project(df, find_peaks_rolling_3_years_polars_optimized)
+
+
+def _polars_exact(df):
+    # app_polars.find_peaks_rolling_3_years_polars_exact is the same loop on
+    # an `edits` column, so it is not benchmarked separately.
+    from polars_migration.community_alerts_polars import (
+        find_peaks_rolling_3_years_polars,
+    )
+
+    return _polars_peaks_per_project(df, find_peaks_rolling_3_years_polars)
+
+
+ENGINES = {
+    # name: (prepare, detect, window definition, quadratic)
+    "pandas_batched": (None, _pandas_batched, "DateOffset(years=3)", False),
+    "pandas_per_project": (None, _pandas_per_project, "DateOffset(years=3)", False),
+    "duckdb": (None, _duckdb, "RANGE INTERVAL 3 YEAR PRECEDING", False),
+    "polars_optimized": (
+        _prepare_polars,
+        _polars_optimized,
+        '"3y", closed both',
+        False,
+    ),
+    "polars_exact": (_prepare_polars, _polars_exact, "timedelta(days=3*365.25)", True),
+}
+
+
+def _max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_engine(name, data_path, projects, repeat):
+    """Time one engine in the current (fresh) process."""
+    prepare, detect, _, _ = ENGINES[name]
+    df = pd.read_pickle(data_path)
+    if projects is not None:
+        df = df[df["project"].isin(projects)].reset_index(drop=True)
+    data = prepare(df) if prepare else df
+    rss_before = _max_rss_mb()
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        peaks = detect(data)
+        timings.append(time.perf_counter() - started)
+
+    # Separate run for memory: tracemalloc slows Python-level loops down.
+    # It sees Python and NumPy allocations only, not Polars' Rust allocator,
+    # which the process RSS high-water mark does include.
+    tracemalloc.start()
+    detect(data)
+    traced_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    peaks = peaks.assign(timestamp=pd.to_datetime(peaks["timestamp"], utc=True))
+    return {
+        "engine": name,
+        "rows": len(df),
+        "projects": df["project"].nunique(),
+        "seconds": min(timings),
+        "traced_peak_mb": traced_peak / 2**20,
+        "max_rss_mb": _max_rss_mb(),
+        "rss_growth_mb": _max_rss_mb() - rss_before,
+        "peaks": peaks,
+    }
+
+
+# --- Parity ---
+def peak_set(peaks):
+    return set(zip(peaks["project"], peaks["timestamp"]))
+
+
+def diff_peaks(reference, peaks, projects=None):
+    """Peaks the engine misses and adds relative to the reference."""
+    expected = peak_set(reference)
+    if projects is not None:
+        expected = {peak for peak in expected if peak[0] in projects}
+    found = peak_set(peaks)
+    return sorted(expected - found), sorted(found - expected)
+
+
+# --- Suite ---
+def run_suite(granularity, projects, years, engines, repeat, exact_sample, seed):
+    df = generate_series(projects, years, granularity, seed)
+    logging.info(
+        f"{granularity}: {len(df):,} rows for {projects:,} projects over {years} years"
+    )
+
+    sample = sorted(df["project"].unique())[:exact_sample]
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    errors = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = os.path.join(tmp, "series.pkl")
+        df.to_pickle(data_path)
+        del df
+
+        for name in engines:
+            quadratic = ENGINES[name][3]
+            if quadratic and not exact_sample:
+                logging.info(f"Skipping {name} (--exact-sample 0)")
+                continue
+            # The O(n^2) loop only gets a sample of projects
+            with context.Pool(1) as pool:
+                try:
+                    results[name] = pool.apply(
+                        run_engine,
+                        (name, data_path, sample if quadratic else None, repeat),
+                    )
+                except Exception as e:
+                    logging.error(f"{name} failed: {type(e).__name__}: {e}")
+                    errors[name] = f"{type(e).__name__}: {e}"
+
+    reference = results.get(REFERENCE_ENGINE)
+    rows = []
+    for name in engines:
+        row = {"granularity": granularity, "engine": name, "window": ENGINES[name][2]}
+        if name in errors:
+            rows.append({**row, "error": errors[name]})
+            continue
+        if name not in results:
+            continue
+        result = results[name]
+        row.update({key: value for key, value in result.items() if key != "peaks"})
+        row.update(
+            rows_per_second=result["rows"] / result["seconds"],
+            peak_count=len(result["peaks"]),
+        )
+        if reference is not None:
+            subset = set(sample) if ENGINES[name][3] else None
+            missing, extra = diff_peaks(reference["peaks"], result["peaks"], subset)
+            row.update(missing=len(missing), extra=len(extra))
+            for label, points in (("missing", missing), ("extra", extra)):
+                if points:
+                    examples = ", ".join(
+                        f"{project}@{ts:%Y-%m-%d}" for project, ts in points[:3]
+                    )
+                    logging.info(f"{name}: {len(points)} {label}, e.g. {examples}")
+        rows.append(row)
+    return rows
+
+
+def report(rows):
+    table = pd.DataFrame(rows).reindex(
+        columns=[
+            "granularity",
+            "engine",
+            "window",
+            "projects",
+            "rows",
+            "seconds",
+            "rows_per_second",
+            "traced_peak_mb",
+            "max_rss_mb",
+            "peak_count",
+            "missing",
+            "extra",
+            "error",
+        ]
+    )
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(table.round(3).fillna("").to_string(index=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Time every peak detector and diff its peaks against pandas."
+    )
+    parser.add_argument("--projects", type=int, default=1000)
+    parser.add_argument("--years", type=int, default=25)
+    parser.add_argument(
+        "--granularity",
+        nargs="+",
+        choices=sorted(FREQUENCIES),
+        default=["monthly"],
+    )
+    parser.add_argument(
+        "--engines", nargs="+", choices=list(ENGINES), default=list(ENGINES)
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Timed runs per engine; best is kept."
+    )
+    parser.add_argument(
+        "--exact-sample",
+        type=int,
+        default=20,
+        help="Projects given to the quadratic polars_exact loop (0 skips it).",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", metavar="PATH", help="Also write the results here.")
+    args = parser.parse_args()
+
+    rows = []
+    for granularity in args.granularity:
+        rows.extend(
+            run_suite(
+                granularity,
+                args.projects,
+                args.years,
+                args.engines,
+                args.repeat,
+                args.exact_sample,
+                args.seed,
+            )
+        )
+    report(rows)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
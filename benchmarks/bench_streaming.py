@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Memory-ceiling check of the streaming Polars detector.
+
+Writes a synthetic edit_counts snapshot (one Parquet file per project, as
+`snapshot.py` lays it out) whose eager in-memory size is `--gigabytes`,
+then runs `community_alerts_polars.stream_peaks` over it in a fresh
+process. Fails (exit status 1) when that process's peak RSS exceeds
+`--ceiling-mb`. Peak RSS should depend on `--chunk-mb`, not on the input.
+
+    python -m benchmarks.bench_streaming --gigabytes 3 --ceiling-mb 1024
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pyarrow as pa
+
+from benchmarks.bench_detectors import generate_series
+
+# --- Setup logging ---
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+BATCH_PROJECTS = 200
+
+
+# --- Synthetic snapshot ---
+def write_snapshot(snapshot_dir, gigabytes, years, granularity, seed):
+    """
+    Write batches of synthetic projects until their eager Arrow size reaches
+    `gigabytes`; only one batch is in memory at a time. Returns (rows, bytes).
+    """
+    import snapshot
+
+    target = gigabytes * 2**30
+    rows = size = batch = 0
+    while size < target:
+        df = generate_series(BATCH_PROJECTS, years, granularity, seed + batch)
+        df["project"] = np.char.add(f"b{batch}-", df["project"].to_numpy(str))
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        for project, project_rows in snapshot.split_by_project(table):
+            snapshot.write_partition("edit_counts", project, project_rows, snapshot_dir)
+        rows += table.num_rows
+        size += table.nbytes
+        batch += 1
+        logging.info(f"Wrote {rows:,} rows ({size / 2**30:.2f} GiB in memory)")
+    return rows, size
+
+
+# --- Measured run (fresh process) ---
+def peak_rss_mb():
+    """
+    High-water RSS of this process. VmHWM belongs to the current address
+    space, whereas ru_maxrss survives fork+exec and would report the
+    parent's (data generating) peak.
+    """
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_streaming(snapshot_dir, chunk_bytes):
+    sys.path.insert(
+        0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "polars_migration")
+    )
+    from community_alerts_polars import snapshot_chunks, stream_peaks
+
+    started = time.perf_counter()
+    peaks = stream_peaks(snapshot_chunks(chunk_bytes, snapshot_dir), lambda _: None)
+    return {
+        "peaks": peaks,
+        "seconds": time.perf_counter() - started,
+        "max_rss_mb": peak_rss_mb(),
+    }
+
+
+def main(gigabytes, ceiling_mb, chunk_mb, years, granularity, seed, keep):
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot_dir = keep or tmp
+        rows, size = write_snapshot(snapshot_dir, gigabytes, years, granularity, seed)
+        on_disk = sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, names in os.walk(snapshot_dir)
+            for name in names
+        )
+
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(1) as pool:
+            result = pool.apply(run_streaming, (snapshot_dir, chunk_mb * 2**20))
+
+    print(
+        f"{rows:,} rows, {size / 2**30:.2f} GiB in memory "
+        f"({on_disk / 2**30:.2f} GiB of Parquet), {chunk_mb} MiB chunks"
+    )
+    print(
+        f"{result['peaks']:,} peaks in {result['seconds']:.1f}s, "
+        f"peak RSS {result['max_rss_mb']:.0f} MiB (ceiling {ceiling_mb} MiB)"
+    )
+    if result["max_rss_mb"] > ceiling_mb:
+        print("FAIL: peak RSS above the ceiling")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check that streaming detection stays under a memory ceiling."
+    )
+    parser.add_argument(
+        "--gigabytes",
+        type=float,
+        default=2,
+        help="Eager in-memory size of the synthetic input.",
+    )
+    parser.add_argument("--ceiling-mb", type=float, default=1024)
+    parser.add_argument(
+        "--chunk-mb",
+        type=float,
+        default=16,
+        help="Parquet MiB per streamed chunk (STREAM_CHUNK_BYTES by default).",
+    )
+    parser.add_argument("--years", type=int, default=25)
+    parser.add_argument("--granularity", choices=["monthly", "daily"], default="daily")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--keep",
+        help="Write the snapshot here and keep it, instead of a temp dir.",
+    )
+    args = parser.parse_args()
+    sys.exit(
+        main(
+            args.gigabytes,
+            args.ceiling_mb,
+            args.chunk_mb,
+            args.years,
+            args.granularity,
+            args.seed,
+            args.keep,
+        )
+    )
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Several worker processes draining one work queue, as concurrent
+`fetch_and_store_cron.py --worker` jobs would.
+
+Each worker claims batches, "fetches" every item (a sleep), heartbeats its
+leases while doing so and completes the batch. `--crash` workers die
+halfway through their first batch, so their leases must expire and be
+reclaimed. Batches outlast `--lease-seconds`, so the leases of healthy
+workers only survive through their heartbeats. Fails (exit status 1) unless
+every item ends up done, completed by exactly one worker, and no healthy
+worker's item was fetched twice.
+
+    python -m benchmarks.bench_work_queue --workers 4 --crash 1
+    python -m benchmarks.bench_work_queue --sqlite /tmp/queue.sqlite
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import date
+
+from work_queue import WorkItem, WorkQueue, connect, worker_id
+
+# --- Setup logging ---
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+
+def run_worker(sqlite_path, log_path, work_seconds, claim_size, lease_seconds, crash):
+    queue = WorkQueue(connect(sqlite_path))
+    owner = worker_id()
+    completed = []
+    fetched = 0
+    while True:
+        items = queue.claim(owner, claim_size, lease_seconds)
+        if not items:
+            break
+        with queue.keep_alive(owner, lease_seconds):
+            for i, item in enumerate(items):
+                if crash and i == len(items) // 2:
+                    os._exit(1)  # a node dying mid-batch: no cleanup at all
+                time.sleep(work_seconds)
+                fetched += 1
+        if queue.complete(owner, items) == len(items):
+            completed.extend(item.project for item in items)
+    with open(log_path, "w") as f:
+        json.dump({"completed": completed, "fetched": fetched}, f)
+
+
+def main(workers, crash, items, claim_size, work_ms, lease_seconds, sqlite_path):
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite_path = sqlite_path or os.path.join(tmp, "queue.sqlite")
+        queue = WorkQueue(connect(sqlite_path))
+        queue.ensure_table()
+        projects = [f"p{i}.example.org" for i in range(items)]
+        queue.enqueue(
+            WorkItem(project, date(2024, 1, 1), date(2024, 1, 1))
+            for project in projects
+        )
+
+        context = multiprocessing.get_context("spawn")
+        logs = [os.path.join(tmp, f"worker-{i}.json") for i in range(workers)]
+        started = time.perf_counter()
+        processes = [
+            context.Process(
+                target=run_worker,
+                args=(
+                    sqlite_path,
+                    log,
+                    work_ms / 1000,
+                    claim_size,
+                    lease_seconds,
+                    i < crash,
+                ),
+            )
+            for i, log in enumerate(logs)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+
+        completions = Counter()
+        fetched = 0
+        for log in logs:
+            if os.path.exists(log):
+                with open(log) as f:
+                    result = json.load(f)
+                completions.update(result["completed"])
+                fetched += result["fetched"]
+        counts = queue.counts()
+
+    serial = items * work_ms / 1000
+    duplicates = sum(1 for n in completions.values() if n > 1)
+    missing = len(set(projects) - set(completions))
+    print(
+        f"{items} items, {workers} workers ({crash} crashing), "
+        f"{claim_size} per claim, {lease_seconds}s leases"
+    )
+    print(
+        f"Drained in {elapsed:.1f}s ({serial:.1f}s of work serially, "
+        f"{serial / elapsed:.1f}x); queue {counts}"
+    )
+    # Crashed workers leave no log, so their lost work is not counted here
+    refetched = fetched - items
+    print(
+        f"{duplicates} completed twice, {missing} never completed, "
+        f"{refetched} fetched again after a lost lease"
+    )
+    if duplicates or missing or refetched or counts != {"done": items}:
+        print("FAIL")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Drain a SQLite work queue with several worker processes."
+    )
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument(
+        "--crash",
+        type=int,
+        default=1,
+        help="Workers that die halfway through their first batch.",
+    )
+    parser.add_argument("--items", type=int, default=120)
+    parser.add_argument("--claim-size", type=int, default=10)
+    parser.add_argument(
+        "--work-ms", type=float, default=300, help="Simulated fetch time per item."
+    )
+    parser.add_argument("--lease-seconds", type=int, default=2)
+    parser.add_argument(
+        "--sqlite", metavar="PATH", help="Queue file to use instead of a temp one."
+    )
+    args = parser.parse_args()
+    sys.exit(
+        main(
+            args.workers,
+            args.crash,
+            args.items,
+            args.claim_size,
+            args.work_ms,
+            args.lease_seconds,
+            args.sqlite,
+        )
+    )
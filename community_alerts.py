@@ -1,10 +1,36 @@
 #!/usr/bin/env python3
 
+import argparse
+from functools import partial
+
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 import pymysql
 import configparser
 import logging
 
+from arrow_loader import (
+    DEFAULT_PARTITIONS,
+    load_arrow,
+    mysql_uri,
+    normalize,
+    to_pandas,
+)
+from db import DEFAULT_BATCH_SIZE, bulk_upsert
+from duckdb_engine import rolling_3_year_stats_duckdb
+from matrix_store import EditMatrix
+from parallel_detection import pandas_stats, run_parallel
+from peak_detection import (
+    ROLLING_WINDOW,
+    is_peak,
+    rolling_3_year_stats_all_projects,
+    rollup_to_monthly,
+    select_new_points,
+)
+import snapshot
+
 # --- Setup logging ---
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -19,57 +45,153 @@ password = cfg["client"]["password"]
 DB_NAME = "s56391__community_alerts"
 SOURCE_TABLE = "edit_counts"
 ALERTS_TABLE = "community_alerts"
+STATE_TABLE = "detection_state"
+STATS_TABLE = "edit_stats"
 
+# Tables of each granularity: daily detection reads edit_counts_daily and
+# keeps its own statistics, alerts and watermarks
+GRANULARITY_TABLES = {
+    "monthly": {
+        "source": SOURCE_TABLE,
+        "alerts": ALERTS_TABLE,
+        "stats": STATS_TABLE,
+        "state": STATE_TABLE,
+    },
+    "daily": {
+        "source": f"{SOURCE_TABLE}_daily",
+        "alerts": f"{ALERTS_TABLE}_daily",
+        "stats": f"{STATS_TABLE}_daily",
+        "state": f"{STATE_TABLE}_daily",
+    },
+}
+MONTHLY_TABLES = GRANULARITY_TABLES["monthly"]
+# Monthly totals of edit_counts_daily (created by fetch_and_store_cron.py),
+# read by monthly detection when only daily counts are fetched
+DAILY_ROLLUP_VIEW = f"{SOURCE_TABLE}_daily_monthly"
 
-# --- Function to detect peaks ---
-def find_peaks_rolling_3_years(df, threshold_percentage=0.30):
-    df = df.sort_values("timestamp").reset_index(drop=True)
-    peaks = []
-
-    for i in range(len(df)):
-        t_i = df.at[i, "timestamp"]
-        edits_i = df.at[i, "edit_count"]
-
-        window = df[
-            (df["timestamp"] >= t_i - pd.DateOffset(years=3)) & (df["timestamp"] <= t_i)
-        ]
-        if window.empty:
-            continue
-
-        rolling_mean = window["edit_count"].mean()
-        threshold = rolling_mean * (1 + threshold_percentage)
-        pct_diff = ((edits_i - rolling_mean) / rolling_mean) * 100
-
-        if edits_i >= threshold:
-            peaks.append(
-                {
-                    "timestamp": t_i,
-                    "edit_count": edits_i,
-                    "rolling_mean": rolling_mean,
-                    "threshold": threshold,
-                    "percentage_difference": pct_diff,
-                }
-            )
+ALERT_COLUMNS = [
+    "project",
+    "timestamp",
+    "edit_count",
+    "rolling_mean",
+    "threshold",
+    "percentage_difference",
+]
+STATS_COLUMNS = ALERT_COLUMNS + ["score"]
 
-    return peaks
 
+# --- Source queries (formatted with a GRANULARITY_TABLES entry) ---
+FULL_QUERY = "SELECT project, timestamp, edit_count FROM {source}"
 
-# --- Main logic ---
-def main():
-    # Connect to DB
-    conn = pymysql.connect(
-        host="tools.db.svc.wikimedia.cloud",
-        user=user,
-        password=password,
-        database=DB_NAME,
-        charset="utf8mb4",
-        autocommit=True,
+# Rows newer than each project's watermark, plus the 3 years of history their
+# windows need. Projects without a watermark are read in full.
+INCREMENTAL_QUERY = """
+SELECT e.project, e.timestamp, e.edit_count, s.last_timestamp
+FROM {source} e
+LEFT JOIN {state} s ON s.project = e.project
+WHERE s.last_timestamp IS NULL
+   OR e.timestamp >= s.last_timestamp - INTERVAL 3 YEAR
+"""
+
+
+# --- Reading from the local Parquet snapshot ---
+def with_daily_rollup(conn, tables=MONTHLY_TABLES):
+    """
+    `tables` reading the monthly roll-up of edit_counts_daily when
+    edit_counts is empty but daily counts exist, so the monthly statistics
+    and alerts (and the views built on them) work with daily fetches only.
+    """
+    daily_source = GRANULARITY_TABLES["daily"]["source"]
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT 1 FROM {tables['source']} LIMIT 1")
+        if cursor.fetchone():
+            return tables
+        try:
+            cursor.execute(f"SELECT 1 FROM {daily_source} LIMIT 1")
+        except pymysql.err.ProgrammingError:
+            return tables  # no daily fetch has run either
+        if not cursor.fetchone():
+            return tables
+    logging.info(f"{tables['source']} is empty; reading {DAILY_ROLLUP_VIEW}")
+    return dict(tables, source=DAILY_ROLLUP_VIEW)
+
+
+def read_source_snapshot(tables=MONTHLY_TABLES):
+    """
+    Every source row from the snapshot. The roll-up view has no snapshot of
+    its own, so it is computed from the edit_counts_daily one.
+    """
+    columns = ["project", "timestamp", "edit_count"]
+    if tables["source"] == DAILY_ROLLUP_VIEW:
+        daily_source = GRANULARITY_TABLES["daily"]["source"]
+        return rollup_to_monthly(
+            to_pandas(normalize(snapshot.read_table(daily_source, columns)))
+        )
+    return to_pandas(normalize(snapshot.read_table(tables["source"], columns)))
+
+
+def read_snapshot(conn, incremental=False, tables=MONTHLY_TABLES):
+    """
+    `FULL_QUERY` / `INCREMENTAL_QUERY` answered from the snapshot of
+    edit_counts; only the small watermark table is read from the database.
+    """
+    df = read_source_snapshot(tables)
+    if not incremental:
+        return df
+    state = pd.read_sql(f"SELECT project, last_timestamp FROM {tables['state']}", conn)
+    watermarks = pd.to_datetime(state.set_index("project")["last_timestamp"], utc=True)
+    df["last_timestamp"] = pd.to_datetime(
+        df["project"].astype(str).map(watermarks), utc=True
     )
+    window_start = df["last_timestamp"] - ROLLING_WINDOW
+    return df[df["last_timestamp"].isna() | (df["timestamp"] >= window_start)]
+
 
-    # Ensure alerts table exists
+# --- DuckDB engine ---
+def duckdb_stats(
+    conn, query, loader, incremental, partitions, threads=None, tables=MONTHLY_TABLES
+):
+    """
+    Statistics of the points to evaluate, computed by DuckDB's window
+    functions. With the snapshot loader, DuckDB scans the Parquet files
+    itself and only the watermarks are read from the database.
+    """
+    watermarks = None
+    if loader == "snapshot":
+        if tables["source"] == DAILY_ROLLUP_VIEW:
+            source = read_source_snapshot(tables)
+        else:
+            source = snapshot.parquet_glob(tables["source"])
+        if incremental:
+            watermarks = pd.read_sql(
+                f"SELECT project, last_timestamp FROM {tables['state']}", conn
+            )
+    elif loader == "arrow":
+        source = load_arrow(query, mysql_uri(user, password), partitions)
+    else:
+        source = pd.read_sql(query, conn)
+    return rolling_3_year_stats_duckdb(
+        source, incremental=incremental, watermarks=watermarks, threads=threads
+    )
+
+
+# --- Matrix engine ---
+def matrix_stats(conn, incremental):
+    """Statistics of the points to evaluate, from the stored edit matrix."""
+    stats = EditMatrix.load().stats_frame()
+    if not incremental:
+        return stats
+    state = pd.read_sql(f"SELECT project, last_timestamp FROM {STATE_TABLE}", conn)
+    watermarks = pd.to_datetime(state.set_index("project")["last_timestamp"], utc=True)
+    last = stats["project"].map(watermarks)
+    return stats[last.isna() | (stats["timestamp"] > last)].reset_index(drop=True)
+
+
+# --- Schema ---
+def ensure_tables(conn, tables=MONTHLY_TABLES):
     with conn.cursor() as cursor:
         cursor.execute(f"""
-        CREATE TABLE IF NOT EXISTS {ALERTS_TABLE} (
+        CREATE TABLE IF NOT EXISTS {tables['alerts']} (
             project VARCHAR(255),
             timestamp DATETIME,
             edit_count INT,
@@ -79,54 +201,342 @@ def main():
             PRIMARY KEY (project, timestamp)
         )
         """)
+        # Rolling statistics of every (project, month), read by the web app.
+        # DOUBLE keeps `edit_count >= threshold` identical to the detector.
+        # `score` is edit_count / rolling_mean, so peaks at any threshold X are
+        # the rows with score >= 1 + X (see peak_detection.is_peak).
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {tables['stats']} (
+            project VARCHAR(255),
+            timestamp DATETIME,
+            edit_count INT,
+            rolling_mean DOUBLE,
+            threshold DOUBLE,
+            percentage_difference DOUBLE,
+            score DOUBLE,
+            PRIMARY KEY (project, timestamp),
+            KEY idx_timestamp_score (timestamp, score)
+        )
+        """)
+        # Tables created before scores were stored
+        cursor.execute(
+            f"ALTER TABLE {tables['stats']} ADD COLUMN IF NOT EXISTS score DOUBLE"
+        )
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_timestamp_score "
+            f"ON {tables['stats']} (timestamp, score)"
+        )
+        # Last month evaluated per project; incremental runs only look at
+        # rows after it.
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {tables['state']} (
+            project VARCHAR(255) PRIMARY KEY,
+            last_timestamp DATETIME,
+            updated_at DATETIME
+        )
+        """)
+
+
+# --- Writes ---
+def stats_rows(stats, columns=ALERT_COLUMNS):
+    rows = []
+    for row in stats[columns].itertuples(index=False):
+        values = [row.project, row.timestamp.to_pydatetime(), int(row.edit_count)]
+        for value in row[3:]:
+            # No score exists for an all-zero window; store NULL, not NaN
+            values.append(float(value) if np.isfinite(value) else None)
+        rows.append(tuple(values))
+    return rows
+
+
+def upsert_alerts(
+    conn, peaks, batch_size=DEFAULT_BATCH_SIZE, table=ALERTS_TABLE, failed=None
+):
+    rows = stats_rows(peaks)
+    written = bulk_upsert(
+        conn, table, ALERT_COLUMNS, rows, ALERT_COLUMNS[2:], batch_size, failed
+    )
+    logging.info(f"Upserted {written} of {len(rows)} peaks into {table}")
+
+
+def upsert_stats(
+    conn, stats, batch_size=DEFAULT_BATCH_SIZE, table=STATS_TABLE, failed=None
+):
+    rows = stats_rows(stats, STATS_COLUMNS)
+    written = bulk_upsert(
+        conn, table, STATS_COLUMNS, rows, STATS_COLUMNS[2:], batch_size, failed
+    )
+    logging.info(f"Upserted {written} of {len(rows)} rows into {table}")
 
-    # Read full edit data
-    df = pd.read_sql(f"SELECT * FROM {SOURCE_TABLE}", conn)
+
+def update_watermarks(conn, evaluated, table=STATE_TABLE, failed_projects=()):
+    """
+    Advance each evaluated project's watermark to its latest evaluated point,
+    except for `failed_projects`, whose rows were not all written: they keep
+    their watermark and are evaluated again by the next run.
+    """
+    if failed_projects:
+        logging.error(
+            f"Not advancing the watermark of {len(failed_projects)} projects "
+            f"with unwritten rows"
+        )
+        evaluated = evaluated[~evaluated["project"].isin(failed_projects)]
+    if evaluated.empty:
+        return
+    # The Arrow loader's project column is categorical: only projects that
+    # were evaluated get a row, not every category of the chunk's dictionary
+    latest = evaluated.groupby("project", observed=True)["timestamp"].max()
+    with conn.cursor() as cursor:
+        cursor.executemany(
+            f"""
+            INSERT INTO {table} (project, last_timestamp, updated_at)
+            VALUES (%s, %s, UTC_TIMESTAMP())
+            ON DUPLICATE KEY UPDATE
+                last_timestamp=GREATEST(last_timestamp, VALUES(last_timestamp)),
+                updated_at=VALUES(updated_at)
+            """,
+            [
+                (project, ts.tz_convert(None).to_pydatetime())
+                for project, ts in latest.items()
+            ],
+        )
+
+
+def store_results(
+    conn, evaluated, batch_size=DEFAULT_BATCH_SIZE, tables=MONTHLY_TABLES, failed=None
+):
+    """
+    Upsert evaluated points and their peaks; returns the peaks. Projects
+    with rows in a failed batch are added to the `failed` set when given.
+    """
+    peaks = evaluated[is_peak(evaluated)]
+    lost = []
+    upsert_stats(conn, evaluated, batch_size, tables["stats"], lost)
+    upsert_alerts(conn, peaks, batch_size, tables["alerts"], lost)
+    if failed is not None:
+        failed.update(row[0] for row in lost)
+    return peaks
+
+
+# --- Parallel pandas engine ---
+def read_source_table(
+    conn, query, loader, incremental, partitions, tables=MONTHLY_TABLES
+):
+    """The rows to detect on as an Arrow table, for handing to worker processes."""
+    if loader == "arrow":
+        return load_arrow(query, mysql_uri(user, password), partitions)
+    if loader == "snapshot":
+        df = read_snapshot(conn, incremental, tables)
+    else:
+        df = pd.read_sql(query, conn)
     df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
+    if incremental:
+        df["last_timestamp"] = pd.to_datetime(df["last_timestamp"], utc=True)
+    return pa.Table.from_pandas(df, preserve_index=False)
+
 
-    # Process each project
-    for project, group in df.groupby("project"):
-        logging.info(f"Analyzing peaks for: {project}")
-
-        peaks = find_peaks_rolling_3_years(group)
-
-        if not peaks:
-            logging.info(f"No peaks found for {project}")
-            continue
-
-        # Insert detected peaks into DB
-        with conn.cursor() as cursor:
-            for peak in peaks:
-                try:
-                    cursor.execute(
-                        f"""
-                        INSERT INTO {ALERTS_TABLE}
-                        (project, timestamp, edit_count, rolling_mean, threshold, percentage_difference)
-                        VALUES (%s, %s, %s, %s, %s, %s)
-                        ON DUPLICATE KEY UPDATE 
-                            edit_count=VALUES(edit_count),
-                            rolling_mean=VALUES(rolling_mean),
-                            threshold=VALUES(threshold),
-                            percentage_difference=VALUES(percentage_difference)
-                    """,
-                        (
-                            project,
-                            peak["timestamp"].to_pydatetime(),
-                            int(peak["edit_count"]),
-                            float(peak["rolling_mean"]),
-                            float(peak["threshold"]),
-                            float(peak["percentage_difference"]),
-                        ),
-                    )
-                except Exception as e:
-                    logging.error(
-                        f"DB insert failed for {project} on {peak['timestamp']}: {e}"
-                    )
+def parallel_stats(
+    conn, table, incremental, workers, batch_size, tables=MONTHLY_TABLES, failed=None
+):
+    """
+    Detect over project chunks of an Arrow `table` in `workers` processes,
+    writing each chunk's results on `conn` as it arrives. Returns the number
+    of points evaluated and of peaks, the latest evaluated timestamp of every
+    project, and the projects with peaks. Projects whose rows were not all
+    written are added to `failed`.
+    """
+    counts = {"points": 0, "peaks": 0}
+    latest = []
+    peak_projects = set()
 
+    def write_chunk(result):
+        evaluated = to_pandas(result)
+        peaks = store_results(conn, evaluated, batch_size, tables, failed)
+        counts["points"] += len(evaluated)
+        counts["peaks"] += len(peaks)
+        latest.append(
+            evaluated.groupby("project", observed=True)["timestamp"].max().reset_index()
+        )
+        peak_projects.update(peaks["project"])
+
+    run_parallel(
+        table, partial(pandas_stats, incremental=incremental), workers, write_chunk
+    )
+    return counts["points"], counts["peaks"], pd.concat(latest), peak_projects
+
+
+# --- Main logic ---
+def main(
+    incremental=False,
+    batch_size=DEFAULT_BATCH_SIZE,
+    loader="arrow",
+    partitions=DEFAULT_PARTITIONS,
+    refresh_snapshot=True,
+    engine="pandas",
+    threads=None,
+    workers=1,
+    granularity="monthly",
+):
+    if engine == "matrix" and granularity != "monthly":
+        raise ValueError("The edit matrix only holds monthly counts")
+    tables = GRANULARITY_TABLES[granularity]
+
+    # Connect to DB
+    conn = pymysql.connect(
+        host="tools.db.svc.wikimedia.cloud",
+        user=user,
+        password=password,
+        database=DB_NAME,
+        charset="utf8mb4",
+        autocommit=True,
+    )
+
+    ensure_tables(conn, tables)
+    if granularity == "monthly" and engine != "matrix":
+        tables = with_daily_rollup(conn, tables)
+    failed_projects = set()  # projects with rows in a failed write batch
+
+    # Read edit data: full history, or only what the new points need
+    query = (INCREMENTAL_QUERY if incremental else FULL_QUERY).format(**tables)
+    parallel = engine == "pandas" and workers > 1
+    if parallel:
+        table = read_source_table(conn, query, loader, incremental, partitions, tables)
+        if table.num_rows == 0:
+            logging.info("No new edit counts to analyze.")
+            conn.close()
+            return
+        project_count = pc.count_distinct(table.column("project")).as_py()
+
+        # Workers compute, this process writes each chunk as it finishes
+        evaluated_count, peak_count, evaluated, peak_projects = parallel_stats(
+            conn, table, incremental, workers, batch_size, tables, failed_projects
+        )
+        del table
+    elif engine == "duckdb":
+        evaluated = duckdb_stats(
+            conn, query, loader, incremental, partitions, threads, tables
+        )
+        project_count = evaluated["project"].nunique()
+    elif engine == "matrix":
+        evaluated = matrix_stats(conn, incremental)
+        project_count = evaluated["project"].nunique()
+    else:
+        if loader == "arrow":
+            df = to_pandas(load_arrow(query, mysql_uri(user, password), partitions))
+        elif loader == "snapshot":
+            df = read_snapshot(conn, incremental, tables)
+        else:
+            df = pd.read_sql(query, conn)
+        if df.empty:
+            logging.info("No new edit counts to analyze.")
+            conn.close()
+            return
+        df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
+        if incremental:
+            df["last_timestamp"] = pd.to_datetime(df["last_timestamp"], utc=True)
+
+        # Compute rolling statistics for every project in one batched pass
+        stats = rolling_3_year_stats_all_projects(df)
+        evaluated = select_new_points(stats, df) if incremental else stats
+        project_count = df["project"].nunique()
+
+    # Persist statistics and peaks
+    if not parallel:
+        peaks = store_results(conn, evaluated, batch_size, tables, failed_projects)
+        evaluated_count, peak_count = len(evaluated), len(peaks)
+        peak_projects = set(peaks["project"].astype(str))
+
+    logging.info(
+        f"Evaluated {evaluated_count} points, found {peak_count} peaks across "
+        f"{len(peak_projects)} of {project_count} projects"
+    )
+
+    # Advance the watermarks once everything is written
+    update_watermarks(conn, evaluated, tables["state"], failed_projects)
     conn.close()
+
+    # Bring the local snapshot of the written tables up to date
+    if refresh_snapshot:
+        uri = mysql_uri(user, password)
+        try:
+            snapshot.refresh_changed(
+                tables["stats"], set(evaluated["project"].astype(str)), uri, partitions
+            )
+            snapshot.refresh_changed(tables["alerts"], peak_projects, uri, partitions)
+        except Exception as e:
+            logging.error(f"Snapshot refresh failed: {e}")
+
     logging.info("Peak detection completed for all projects.")
 
 
 # --- Run ---
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Detect edit activity peaks.")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only evaluate months added since the previous run.",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="Rows per multi-row upsert transaction.",
+    )
+    parser.add_argument(
+        "--loader",
+        choices=["arrow", "snapshot", "sql"],
+        default="arrow",
+        help="Read edit_counts through connectorx into Arrow, from the local "
+        "Parquet snapshot, or with pd.read_sql.",
+    )
+    parser.add_argument(
+        "--partitions",
+        type=int,
+        default=DEFAULT_PARTITIONS,
+        help="Parallel connections for the Arrow loader, split by project.",
+    )
+    parser.add_argument(
+        "--no-snapshot",
+        action="store_true",
+        help="Don't refresh the local Parquet snapshot after writing.",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=["pandas", "duckdb", "matrix"],
+        default="pandas",
+        help="Compute the rolling statistics with NumPy/pandas, with DuckDB "
+        "window functions, or on the stored project x month edit matrix "
+        "(ignores --loader).",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        help="DuckDB worker threads (default: all cores).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Processes for the pandas engine; projects are split into chunks "
+        "that run in parallel while results are written as they finish.",
+    )
+    parser.add_argument(
+        "--granularity",
+        choices=list(GRANULARITY_TABLES),
+        default="monthly",
+        help="Detect on edit_counts, or on edit_counts_daily into the _daily "
+        "statistics, alerts and watermark tables.",
+    )
+    args = parser.parse_args()
+    main(
+        incremental=args.incremental,
+        batch_size=args.batch_size,
+        loader=args.loader,
+        partitions=args.partitions,
+        refresh_snapshot=not args.no_snapshot,
+        engine=args.engine,
+        threads=args.threads,
+        workers=args.workers,
+        granularity=args.granularity,
+    )
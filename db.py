@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+
+import configparser
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import pymysql
+
+REPLICA_CNF = "/data/project/community-activity-alerts-system/replica.my.cnf"
+DB_HOST = "tools.db.svc.wikimedia.cloud"
+DB_NAME = "s56391__community_alerts"
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_POOL_SIZE = 5
+DEFAULT_MAX_IDLE = 300  # seconds an idle connection is kept before recycling
+DEFAULT_CHECKOUT_TIMEOUT = 10
+
+
+# --- Credentials ---
+def load_credentials(path=REPLICA_CNF):
+    cfg = configparser.ConfigParser()
+    cfg.read(path)
+    return cfg["client"]["user"], cfg["client"]["password"]
+
+
+# --- Connection pool ---
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Bounded pool of pymysql connections.
+
+    Credentials are read once when the pool is created. Checked-out
+    connections are pinged first and replaced if the server dropped them;
+    connections idle for longer than `max_idle` seconds are closed instead of
+    reused. At most `max_size` connections exist at once; further checkouts
+    wait up to `timeout` seconds for one to be returned.
+    """
+
+    def __init__(
+        self,
+        max_size=DEFAULT_POOL_SIZE,
+        max_idle=DEFAULT_MAX_IDLE,
+        timeout=DEFAULT_CHECKOUT_TIMEOUT,
+        **connect_kwargs,
+    ):
+        if "user" not in connect_kwargs:
+            connect_kwargs["user"], connect_kwargs["password"] = load_credentials()
+        connect_kwargs.setdefault("host", DB_HOST)
+        connect_kwargs.setdefault("database", DB_NAME)
+        connect_kwargs.setdefault("charset", "utf8mb4")
+        connect_kwargs.setdefault("autocommit", True)
+
+        self.connect_kwargs = connect_kwargs
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.idle = deque()  # (connection, returned_at), most recent last
+        self.size = 0
+        self.cond = threading.Condition()
+
+    def _healthy(self, conn, returned_at):
+        if time.monotonic() - returned_at > self.max_idle:
+            return False
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except pymysql.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except pymysql.Error:
+            pass
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        with self.cond:
+            while True:
+                while self.idle:
+                    conn, returned_at = self.idle.pop()
+                    if self._healthy(conn, returned_at):
+                        return conn
+                    self._discard(conn)
+                    self.size -= 1
+                if self.size < self.max_size:
+                    self.size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(
+                        f"No database connection free after {self.timeout}s"
+                    )
+                self.cond.wait(remaining)
+
+        try:
+            return pymysql.connect(**self.connect_kwargs)
+        except Exception:
+            with self.cond:
+                self.size -= 1
+                self.cond.notify()
+            raise
+
+    def release(self, conn):
+        with self.cond:
+            if conn.open:
+                self.idle.append((conn, time.monotonic()))
+            else:
+                self.size -= 1
+            self.cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        except pymysql.Error:
+            # The connection may be in an unknown state; don't hand it out again
+            self._discard(conn)
+            raise
+        finally:
+            self.release(conn)
+
+    def close(self):
+        with self.cond:
+            while self.idle:
+                self._discard(self.idle.pop()[0])
+                self.size -= 1
+
+
+# --- Bulk writes ---
+def upsert_sql(table, columns, update_columns=None):
+    if update_columns is None:
+        update_columns = columns
+    updates = ",\n        ".join(f"{col}=VALUES({col})" for col in update_columns)
+    return f"""
+    INSERT INTO {table} ({", ".join(columns)})
+    VALUES ({", ".join(["%s"] * len(columns))})
+    ON DUPLICATE KEY UPDATE
+        {updates}
+    """
+
+
+def bulk_upsert(
+    conn,
+    table,
+    columns,
+    rows,
+    update_columns=None,
+    batch_size=DEFAULT_BATCH_SIZE,
+    failed=None,
+):
+    """
+    Insert or update `rows` (sequences ordered like `columns`) in batches.
+
+    Each batch is sent through `executemany`, which pymysql rewrites into
+    multi-row `INSERT ... VALUES (...), (...) ON DUPLICATE KEY UPDATE`
+    statements, and runs inside its own transaction. A failing batch is
+    rolled back and logged; the remaining batches are still written. The
+    rows of failed batches are appended to the `failed` list when one is
+    given. Returns the number of rows written.
+    """
+    sql = upsert_sql(table, columns, update_columns)
+    rows = list(rows)
+    written = 0
+
+    for offset in range(0, len(rows), batch_size):
+        batch = rows[offset : offset + batch_size]
+        conn.begin()
+        try:
+            with conn.cursor() as cursor:
+                cursor.executemany(sql, batch)
+            conn.commit()
+            written += len(batch)
+        except Exception as e:
+            conn.rollback()
+            logging.error(
+                f"Bulk upsert into {table} failed for rows "
+                f"{offset}-{offset + len(batch) - 1}: {e}"
+            )
+            if failed is not None:
+                failed.extend(batch)
+
+    return written
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+import duckdb
+
+from peak_detection import DEFAULT_THRESHOLD
+
+# Same window as peak_detection.ROLLING_WINDOW: [t - 3 calendar years, t],
+# including every row that shares t. Timestamps are compared in UTC.
+STATS_SQL = """
+WITH source_rows AS (
+    SELECT
+        s.project::VARCHAR AS project,
+        s.timestamp::TIMESTAMPTZ AS timestamp,
+        s.edit_count,
+        {last_timestamp} AS last_timestamp
+    FROM source s
+    {join}
+),
+windowed AS (
+    SELECT
+        *,
+        AVG(edit_count) OVER (
+            PARTITION BY project
+            ORDER BY timestamp
+            RANGE BETWEEN INTERVAL 3 YEAR PRECEDING AND CURRENT ROW
+        ) AS rolling_mean
+    FROM source_rows
+    {history}
+)
+SELECT
+    project,
+    timestamp,
+    edit_count,
+    rolling_mean,
+    rolling_mean * (1 + $threshold) AS threshold,
+    (edit_count - rolling_mean) / rolling_mean * 100 AS percentage_difference,
+    CASE WHEN rolling_mean > 0 THEN edit_count / rolling_mean END AS score
+FROM windowed
+{new_points}
+ORDER BY project, timestamp
+"""
+
+
+def connect(threads=None):
+    con = duckdb.connect()
+    con.execute("SET TimeZone = 'UTC'")
+    if threads:
+        con.execute(f"SET threads = {int(threads)}")
+    return con
+
+
+def register_source(con, source):
+    """
+    Expose `source` as the `source` relation: a pandas/Polars/Arrow table is
+    scanned in place, a string is read as Parquet (path or glob, e.g. the
+    edit_counts snapshot).
+    """
+    if isinstance(source, str):
+        con.execute(
+            f"CREATE OR REPLACE VIEW source AS SELECT * FROM read_parquet('{source}')"
+        )
+    else:
+        con.register("source", source)
+
+
+def rolling_3_year_stats_duckdb(
+    source,
+    threshold_percentage=DEFAULT_THRESHOLD,
+    incremental=False,
+    watermarks=None,
+    threads=None,
+):
+    """
+    Rolling statistics of every project with one window-function query, in
+    the column layout of `rolling_3_year_stats_all_projects` (plus project).
+
+    With `incremental`, only rows after each project's `last_timestamp` are
+    returned, and only the 3 years of history they need are windowed. The
+    watermark comes from a `last_timestamp` column of `source` (as read by
+    INCREMENTAL_QUERY) or from a `watermarks` frame of (project,
+    last_timestamp).
+    """
+    con = connect(threads)
+    register_source(con, source)
+
+    join = ""
+    last_timestamp = "NULL::TIMESTAMPTZ"
+    if incremental:
+        if watermarks is not None:
+            con.register("watermarks", watermarks)
+            join = "LEFT JOIN watermarks w ON w.project = s.project::VARCHAR"
+            last_timestamp = "w.last_timestamp::TIMESTAMPTZ"
+        else:
+            last_timestamp = "s.last_timestamp::TIMESTAMPTZ"
+
+    query = STATS_SQL.format(
+        last_timestamp=last_timestamp,
+        join=join,
+        history=(
+            "WHERE last_timestamp IS NULL "
+            "OR timestamp >= last_timestamp - INTERVAL 3 YEAR"
+            if incremental
+            else ""
+        ),
+        new_points=(
+            "WHERE last_timestamp IS NULL OR timestamp > last_timestamp"
+            if incremental
+            else ""
+        ),
+    )
+    try:
+        return con.execute(query, {"threshold": threshold_percentage}).df()
+    finally:
+        con.close()
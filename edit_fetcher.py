@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+
+import aiohttp
+from tenacity import (
+    AsyncRetrying,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+
+# --- API config ---
+METRICS_BASE_URL = "https://wikimedia.org/api/rest_v1/metrics"
+API_BASE_URL = f"{METRICS_BASE_URL}/edits/aggregate"
+HEADERS = {
+    "User-Agent": "Community Activity Alerts (https://github.com/indictechcom/community-activity-alerts; tools.community-activity-alerts-system@toolforge.org)",
+}
+
+# Defaults stay well under the Wikimedia REST API limits
+DEFAULT_CONCURRENCY = 8
+DEFAULT_RATE = 20.0  # requests per second, across all workers
+DEFAULT_ATTEMPTS = 5
+DEFAULT_TIMEOUT = 30
+
+# Statuses worth retrying; everything else is final
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RetryableStatus(Exception):
+    def __init__(self, status, retry_after=None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class Metric:
+    """
+    One aggregate series of the REST API (`kind` is "edits" or "editors"),
+    stored in `column`. Results carry the value under the `kind` key.
+    """
+
+    column: str
+    kind: str = "edits"
+    editor_type: str = "all-editor-types"
+    page_type: str = "content"
+
+    def path(self, project, granularity, start, end):
+        activity = "/all-activity-levels" if self.kind == "editors" else ""
+        return (
+            f"{self.kind}/aggregate/{project}/{self.editor_type}/{self.page_type}"
+            f"{activity}/{granularity}/{start}/{end}"
+        )
+
+
+@dataclass
+class FetchTask:
+    project: str
+    start: str  # YYYYMMDD
+    end: str  # YYYYMMDD
+    metric: Metric = None  # None: the run's edit series
+
+
+@dataclass
+class FetchResult:
+    task: FetchTask
+    status: int = 0
+    results: list = field(default_factory=list)
+    error: str = ""
+
+    @property
+    def ok(self):
+        return self.status == 200 and not self.error
+
+
+# --- Global request budget ---
+class RateLimiter:
+    """Token bucket shared by every worker of a fetch run."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# --- Fetch engine ---
+def build_url(task, base_url, editor_type, page_type, granularity):
+    if task.metric is not None:
+        # Other metrics live beside the edits endpoint that `base_url` names
+        root = base_url.removesuffix("/edits/aggregate")
+        return f"{root}/{task.metric.path(task.project, granularity, task.start, task.end)}"
+    return (
+        f"{base_url}/{task.project}/{editor_type}/{page_type}/"
+        f"{granularity}/{task.start}/{task.end}"
+    )
+
+
+async def _get_json(session, limiter, url, recorder=None):
+    await limiter.acquire()
+    async with session.get(url) as response:
+        text = await response.text()
+        if recorder is not None:
+            recorder.record(url, response.status, text, response.content_type)
+        if response.status in RETRY_STATUSES:
+            retry_after = response.headers.get("Retry-After")
+            raise RetryableStatus(
+                response.status,
+                float(retry_after) if retry_after and retry_after.isdigit() else None,
+            )
+        if response.status != 200:
+            return response.status, None, text
+        return response.status, json.loads(text), ""
+
+
+async def _fetch_one(session, limiter, task, url, max_attempts, recorder=None):
+    retrying = AsyncRetrying(
+        stop=stop_after_attempt(max_attempts),
+        wait=wait_random_exponential(multiplier=1, max=30),
+        retry=retry_if_exception_type(
+            (aiohttp.ClientError, asyncio.TimeoutError, RetryableStatus)
+        ),
+        reraise=True,
+    )
+    try:
+        async for attempt in retrying:
+            with attempt:
+                try:
+                    status, data, text = await _get_json(
+                        session, limiter, url, recorder
+                    )
+                except RetryableStatus as e:
+                    # Honour the server's back-off request before tenacity's own
+                    if e.retry_after:
+                        await asyncio.sleep(e.retry_after)
+                    raise
+    except Exception as e:
+        logging.warning(f"Giving up on {task.project}: {e!r}")
+        return FetchResult(task, getattr(e, "status", 0), error=repr(e))
+
+    if status != 200:
+        logging.warning(f"API Error for {task.project}: {status} - {text}")
+        return FetchResult(task, status, error=text)
+
+    try:
+        return FetchResult(task, status, data["items"][0]["results"])
+    except (KeyError, IndexError, TypeError) as e:
+        logging.error(f"Parsing error for {task.project}: {e}")
+        return FetchResult(task, status, error=f"parse error: {e}")
+
+
+async def fetch_edit_counts_async(
+    tasks,
+    base_url=API_BASE_URL,
+    editor_type="all-editor-types",
+    page_type="content",
+    granularity="monthly",
+    concurrency=DEFAULT_CONCURRENCY,
+    rate=DEFAULT_RATE,
+    max_attempts=DEFAULT_ATTEMPTS,
+    timeout=DEFAULT_TIMEOUT,
+    recorder=None,
+):
+    """
+    Fetch edit counts for every task over one keep-alive connection pool.
+
+    At most `concurrency` requests are in flight and at most `rate` requests
+    per second are started, retries included. Results are yielded as they
+    complete, so callers can write them while the rest are still in flight.
+    Every response is passed to `recorder` (an `http_archive.HttpArchive`)
+    when one is given.
+    """
+    limiter = RateLimiter(rate)
+    connector = aiohttp.TCPConnector(limit=concurrency, keepalive_timeout=60)
+    queue = asyncio.Queue()
+    for task in tasks:
+        queue.put_nowait(task)
+    total = queue.qsize()
+    done = asyncio.Queue()
+
+    async with aiohttp.ClientSession(
+        connector=connector,
+        headers=HEADERS,
+        timeout=aiohttp.ClientTimeout(total=timeout),
+        raise_for_status=False,
+    ) as session:
+
+        async def worker():
+            while True:
+                try:
+                    task = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                url = build_url(task, base_url, editor_type, page_type, granularity)
+                await done.put(
+                    await _fetch_one(
+                        session, limiter, task, url, max_attempts, recorder
+                    )
+                )
+
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        for _ in range(total):
+            yield await done.get()
+        await asyncio.gather(*workers)
+
+
+def fetch_edit_counts(tasks, **kwargs):
+    """Blocking wrapper: run the async engine and return every FetchResult."""
+
+    async def collect():
+        return [result async for result in fetch_edit_counts_async(tasks, **kwargs)]
+
+    return asyncio.run(collect())
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+from collections import defaultdict
+from dataclasses import replace
+
+import pandas as pd
+
+from edit_fetcher import Metric
+from ingest_planner import STATE_TABLE
+
+METRICS_TABLE = "edit_metrics"
+METRICS_STATE_TABLE = f"{STATE_TABLE}_metrics"
+
+# Series fetched for every project gap. Metrics sharing a column are summed.
+METRICS = (
+    Metric("edit_count"),  # the edit_counts series
+    Metric("edits_all_pages", page_type="all-page-types"),
+    Metric("edits_user", editor_type="user"),
+    Metric("edits_bot", editor_type="group-bot"),
+    Metric("edits_bot", editor_type="name-bot"),
+    Metric("editors", kind="editors"),
+)
+METRIC_COLUMNS = list(dict.fromkeys(metric.column for metric in METRICS))
+COLUMNS = ["project", "timestamp"] + METRIC_COLUMNS
+
+
+def metric_tasks(tasks, metrics=METRICS):
+    """One request per metric for every planned gap, to run in the same pass."""
+    return [replace(task, metric=metric) for task in tasks for metric in metrics]
+
+
+def ensure_table(cursor):
+    metric_columns = ",\n".join(f"    {column} INT" for column in METRIC_COLUMNS)
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS {METRICS_TABLE} (
+        project VARCHAR(255),
+        timestamp DATETIME,
+    {metric_columns},
+        PRIMARY KEY (project, timestamp)
+    )
+    """)
+
+
+def metric_rows(project, results):
+    """
+    One wide row (ordered like COLUMNS) per month of a project's results.
+    A metric without a value for a month that others have (e.g. a 404 for
+    no bot edits) counts as 0.
+    """
+    values = defaultdict(lambda: dict.fromkeys(METRIC_COLUMNS, 0))
+    for result in results:
+        if not (result.ok and result.results):
+            continue
+        metric = result.task.metric
+        for item in result.results:
+            values[item["timestamp"]][metric.column] += int(item[metric.kind])
+
+    timestamps = pd.to_datetime(list(values), utc=True)
+    return [
+        (project, ts.to_pydatetime(), *month.values())
+        for ts, month in sorted(zip(timestamps, values.values()), key=lambda x: x[0])
+    ]
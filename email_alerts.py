@@ -1,3 +1,4 @@
+import argparse
 import os
 import smtplib
 import pandas as pd
@@ -9,6 +10,9 @@ import configparser
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
 
+from global_events import load_events
+from peak_detection import DEFAULT_THRESHOLD
+
 # --- Setup logging ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -30,6 +34,7 @@ password = cfg['client']['password']
 DB_NAME = 's56391__community_alerts'
 DB_HOST = 'tools.db.svc.wikimedia.cloud'
 ALERTS_TABLE = 'community_alerts'
+STATS_TABLE = 'edit_stats'
 
 # --- Connect to MySQL DB ---
 conn = pymysql.connect(
@@ -75,8 +80,30 @@ def send_email(subject, html_body, recipients):
     except Exception as e:
         logging.error(f"Failed to send email: {e}")
 
-def build_email_content(df_filtered):
-    intro = "<p>This is a summary of peak edit activities across projects for the last month.</p>"
+def build_events_content(events):
+    """Months in which many wikis peaked together (see global_events.py)."""
+    if events.empty:
+        return ""
+    html = "<h3>Global Events</h3><ul>"
+    for _, event in events.iterrows():
+        families = ", ".join(
+            f"{family}: {count}"
+            for family, count in sorted(event['families'].items(), key=lambda item: -item[1])
+        )
+        top = ", ".join(event['projects'][:10])
+        html += (
+            f"<li><b>{event['month']:%Y-%m}</b> — {event['peak_count']} of "
+            f"{event['project_count']} wikis peaked (expected {event['expected']:.0f}, "
+            f"z = {event['z_score']:.1f}). By family: {families}. "
+            f"Strongest: {top}</li>"
+        )
+    return html + "</ul>"
+
+def build_email_content(df_filtered, threshold_percentage=DEFAULT_THRESHOLD, events=None):
+    intro = (
+        "<p>This is a summary of peak edit activities across projects for the last month "
+        f"(at least {threshold_percentage * 100:g}% over the 3-year rolling mean).</p>"
+    )
     html_table = dataframe_to_html_table(df_filtered)
 
     top_alerts = df_filtered.sort_values(by='percentage_difference', ascending=False).head(3)
@@ -91,38 +118,63 @@ def build_email_content(df_filtered):
             )
         summary += "</ul>"
 
-    return intro + summary + "<h3>All Activity Peaks</h3>" + html_table
+    events_html = build_events_content(events) if events is not None else ""
+    return intro + events_html + summary + "<h3>All Activity Peaks</h3>" + html_table
 
 # --- Main ---
-def main():
+def main(threshold_percentage=DEFAULT_THRESHOLD):
+    this_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    last_month = this_month - relativedelta(months=1)
+
+    # The digest reads edit_stats, not community_alerts: peaks at any
+    # threshold are the rows whose stored score (edits divided by the rolling
+    # mean) is at least 1 + threshold, a range read on the (timestamp, score)
+    # index. At the default threshold these are exactly the community_alerts
+    # rows (peak_detection.is_peak).
     try:
-        df = pd.read_sql(f"SELECT * FROM {ALERTS_TABLE}", conn)
-        df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True)
-        df['year'] = df['timestamp'].dt.year
-        df['month'] = df['timestamp'].dt.month
-        logging.info(f"Loaded {len(df)} alerts from DB.")
+        df_filtered = pd.read_sql(
+            f"""
+            SELECT project, timestamp, edit_count, rolling_mean,
+                   rolling_mean * (1 + %s) AS threshold, percentage_difference
+            FROM {STATS_TABLE}
+            WHERE timestamp >= %s AND timestamp < %s
+              AND score >= %s
+            """,
+            conn,
+            params=(threshold_percentage, last_month, this_month, 1 + threshold_percentage),
+        )
+        df_filtered['timestamp'] = pd.to_datetime(df_filtered['timestamp'], utc=True)
+        logging.info(f"Loaded {len(df_filtered)} alerts from DB.")
     except Exception as e:
         logging.error(f"Error loading alerts: {e}")
         return
 
-    now = datetime.now().replace(day=1)
-    last_month = now - relativedelta(months=1)
-
-    df_filtered = df[
-        (df['year'] == last_month.year) & (df['month'] == last_month.month)
-    ].copy()
+    try:
+        events = load_events(conn, last_month, this_month - relativedelta(seconds=1))
+    except Exception as e:
+        logging.warning(f"Global events unavailable: {e}")
+        events = None
 
-    if df_filtered.empty:
+    if df_filtered.empty and (events is None or events.empty):
         logging.info("No alerts found for the previous month.")
         return
 
-    df_filtered.drop(columns=['year', 'month'], inplace=True)
     df_filtered['timestamp'] = df_filtered['timestamp'].dt.strftime("%Y-%m-%d")
 
     subject = "[Wiki Alerts] Peak Edit Activity for Last Month"
-    email_body = "<h2>Alerts for Last Month</h2>" + build_email_content(df_filtered)
+    email_body = "<h2>Alerts for Last Month</h2>" + build_email_content(
+        df_filtered, threshold_percentage, events
+    )
     send_email(subject, email_body, MAILING_LIST)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Email last month's activity peaks.")
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=DEFAULT_THRESHOLD * 100,
+        help="Percent over the 3-year rolling mean that counts as a peak.",
+    )
+    args = parser.parse_args()
+    main(threshold_percentage=args.threshold / 100)
 
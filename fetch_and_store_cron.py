@@ -1,13 +1,46 @@
 #!/usr/bin/env python3
 
-import requests
+import argparse
+import asyncio
+from collections import Counter, defaultdict
 import pandas as pd
 import pymysql
 import configparser
 from datetime import datetime, timedelta
 import logging
-import time
-from random import uniform
+
+from arrow_loader import mysql_uri
+from db import DEFAULT_BATCH_SIZE, bulk_upsert
+from edit_fetcher import (
+    API_BASE_URL,
+    DEFAULT_CONCURRENCY,
+    DEFAULT_RATE,
+    fetch_edit_counts_async,
+)
+import edit_metrics
+from http_archive import HttpArchive
+from ingest_planner import (
+    STATE_COLUMNS,
+    STATE_TABLE,
+    add_months,
+    completed_state,
+    ensure_state_table,
+    load_states,
+    load_stored_months,
+    plan_tasks,
+)
+from sitematrix import SITEMATRIX_URL, SNAPSHOT_PATH, SiteMatrixCache
+import fetch_scheduler
+import matrix_store
+import snapshot
+from work_queue import (
+    DEFAULT_CLAIM_SIZE,
+    DEFAULT_LEASE_SECONDS,
+    WorkItem,
+    WorkQueue,
+    connect as connect_queue,
+    worker_id,
+)
 
 # --- Configure logging ---
 logging.basicConfig(
@@ -20,126 +53,613 @@ cfg.read("/data/project/community-activity-alerts-system/replica.my.cnf")
 user = cfg["client"]["user"]
 password = cfg["client"]["password"]
 
-# --- Fetch project list from SiteMatrix ---
-sitematrix_url = "https://meta.wikimedia.org/w/api.php?action=sitematrix&format=json"
-response = requests.get(sitematrix_url)
-data = response.json()
-
-projects = set()
-sitematrix = data.get("sitematrix", {})
-
-for key, val in sitematrix.items():
-    if key in ("count", "specials"):
-        continue
-    if isinstance(val, dict):
-        sites = val.get("site", [])
-        for site in sites:
-            if site.get("closed"):
-                continue
-            site_url = site.get("url")
-            if site_url:
-                cleaned_url = site_url.replace("https://", "")
-                projects.add(cleaned_url)
-
-# --- Date range for last month ---
-today = datetime.utcnow().date().replace(day=1)
-last_month_end = today - timedelta(days=1)
-last_month_start = last_month_end.replace(day=1)
-
-start = last_month_start.strftime("%Y%m%d")
-end = last_month_end.strftime("%Y%m%d")
-
-# --- Connect to Toolforge DB ---
 DB_NAME = "s56391__community_alerts"
 DB_TABLE = "edit_counts"
+DAILY_TABLE = "edit_counts_daily"
+DAILY_ROLLUP_VIEW = "edit_counts_daily_monthly"
+EDIT_COLUMNS = ["timestamp", "edit_count", "project"]
 
-conn = pymysql.connect(
-    host="tools.db.svc.wikimedia.cloud",
-    user=user,
-    password=password,
-    database=DB_NAME,
-    charset="utf8mb4",
-    autocommit=True,
-)
+# Edit counts table, fetch state table and community_alerts.py watermark
+# tables of each granularity. Monthly detection reads the roll-up of daily
+# counts when edit_counts is empty, so daily backfills rewind both.
+GRANULARITY_TABLES = {
+    "monthly": (DB_TABLE, STATE_TABLE, ("detection_state",)),
+    "daily": (
+        DAILY_TABLE,
+        f"{STATE_TABLE}_daily",
+        ("detection_state_daily", "detection_state"),
+    ),
+}
+# Monthly counts the scheduler tiers projects by: daily-only projects have
+# no edit_counts rows, so daily runs read the roll-up of their days
+ACTIVITY_TABLES = {"monthly": DB_TABLE, "daily": DAILY_ROLLUP_VIEW}
 
-cursor = conn.cursor()
 
-# --- Ensure main table exists ---
-create_table_sql = f"""
-CREATE TABLE IF NOT EXISTS {DB_TABLE} (
-    timestamp DATETIME,
-    edit_count INT,
-    project VARCHAR(255),
-    PRIMARY KEY (timestamp, project)
-)
-"""
-cursor.execute(create_table_sql)
-
-# --- Optional: Metadata table for fetch status ---
-# cursor.execute('''
-# CREATE TABLE IF NOT EXISTS fetch_runs (
-#     run_time DATETIME,
-#     project VARCHAR(255),
-#     status VARCHAR(20),
-#     message TEXT
-# )
-# ''')
-
-# --- API config ---
-base_url = "https://wikimedia.org/api/rest_v1/metrics/edits/aggregate"
-editor_type = "all-editor-types"
-page_type = "content"
-granularity = "monthly"
-
-# --- Loop through projects ---
-for project in sorted(projects):
-    logging.info(f"Fetching edits for {project} from {start} to {end}")
-
-    url = f"{base_url}/{project}/{editor_type}/{page_type}/{granularity}/{start}/{end}"
-    response = requests.get(url)
-    if response.status_code != 200:
-        logging.warning(
-            f"API Error for {project}: {response.status_code} - {response.text}"
+# --- Fetch project list from the cached SiteMatrix ---
+def get_projects(url=SITEMATRIX_URL, recorder=None):
+    # A non-default URL (e.g. a replay server) must not overwrite the snapshot
+    cache = SiteMatrixCache(
+        url, snapshot_path=SNAPSHOT_PATH if url == SITEMATRIX_URL else None
+    )
+    if recorder is not None:
+        recorder.record(url, 200, cache.raw())
+    return cache.open_projects()
+
+
+# --- Date range to cover ---
+def desired_month_range(backfill_months=1):
+    """The last `backfill_months` complete months, as (first, last) month starts."""
+    last = add_months(datetime.utcnow().date().replace(day=1), -1)
+    return add_months(last, 1 - backfill_months), last
+
+
+# --- Ensure tables exist ---
+def ensure_tables(cursor, granularity="monthly", metrics=False):
+    table, state_table, _ = GRANULARITY_TABLES[granularity]
+    # The web app joins edit_metrics, so it exists even before a metrics run
+    edit_metrics.ensure_table(cursor)
+    if metrics:
+        ensure_state_table(cursor, edit_metrics.METRICS_STATE_TABLE)
+    if granularity == "daily":
+        # ~30x the rows of edit_counts: a 3-byte DATE instead of DATETIME,
+        # and the primary key clusters each project's days together, so
+        # per-project range reads and the roll-up touch contiguous pages.
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            project VARCHAR(255),
+            timestamp DATE,
+            edit_count INT,
+            PRIMARY KEY (project, timestamp)
         )
-        time.sleep(uniform(1, 3))  # Sleep before next request
-        continue
-
-    try:
-        data = response.json()
-        edit_counts = data["items"][0]["results"]
-        if not edit_counts:
-            logging.info(f"No data returned for {project}")
-            continue
-    except Exception as e:
-        logging.error(f"Parsing error for {project}: {e}")
-        continue
+        """)
+        # Monthly totals of the daily rows, in the layout of edit_counts
+        cursor.execute(f"""
+        CREATE OR REPLACE VIEW {DAILY_ROLLUP_VIEW} AS
+        SELECT project,
+               CAST(DATE_FORMAT(timestamp, '%Y-%m-01') AS DATETIME) AS timestamp,
+               SUM(edit_count) AS edit_count
+        FROM {table}
+        GROUP BY project, DATE_FORMAT(timestamp, '%Y-%m-01')
+        """)
+    else:
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            timestamp DATETIME,
+            edit_count INT,
+            project VARCHAR(255),
+            PRIMARY KEY (timestamp, project)
+        )
+        """)
+    ensure_state_table(cursor, state_table)
+
 
+# --- Convert one project's results to table rows ---
+def results_to_rows(project, edit_counts):
     df = pd.DataFrame(edit_counts)
     df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
-    df["project"] = project
-    df.rename(columns={"edits": "edit_count"}, inplace=True)
+    return [
+        (ts.to_pydatetime(), int(edits), project)
+        for ts, edits in zip(df["timestamp"], df["edits"])
+    ]
 
-    for _, row in df.iterrows():
-        try:
-            insert_sql = f"""
-            INSERT INTO {DB_TABLE} (timestamp, edit_count, project)
-            VALUES (%s, %s, %s)
-            ON DUPLICATE KEY UPDATE edit_count = VALUES(edit_count)
-            """
-            cursor.execute(
-                insert_sql,
+
+# --- Buffered writer for rows and per-project state ---
+class IngestWriter:
+    """
+    Buffers fetched rows and finished projects' state, flushing both every
+    `batch_size` rows. State rows are only written after the edit counts they
+    describe, so a killed run never records a project as fetched too early.
+
+    With `metrics`, results of every metric of a project are also pivoted
+    into one wide edit_metrics row per month. With `detection_tables`, the
+    detection watermarks of a project that receives months at or before
+    them are moved back, so those months get evaluated.
+    """
+
+    def __init__(
+        self,
+        conn,
+        states,
+        desired_first,
+        desired_last,
+        batch_size,
+        table=DB_TABLE,
+        state_table=STATE_TABLE,
+        metrics=False,
+        detection_tables=(),
+    ):
+        self.conn = conn
+        self.metrics = metrics
+        self.detection_tables = detection_tables
+        self.table = table
+        self.state_table = state_table
+        self.states = states
+        self.desired_first = desired_first
+        self.desired_last = desired_last
+        self.batch_size = batch_size
+        self.rows = []
+        self.metric_rows = []
+        self.finished = []
+        self.written = 0
+        self.updated = set()  # projects that received rows
+        self.failed = {}  # project -> error of projects whose fetch failed
+
+    def add_project(self, project, results):
+        # The API answers 404 for projects with no edits in the range; that
+        # is a complete answer, not a failure to retry.
+        errors = [
+            result.error or f"HTTP {result.status}"
+            for result in results
+            if not result.ok and result.status != 404
+        ]
+        for result in results:
+            if result.ok and result.results:
+                metric = result.task.metric
+                if metric is None or metric.column == "edit_count":
+                    self.rows.extend(results_to_rows(project, result.results))
+                self.updated.add(project)
+        # A failed metric would be stored as 0 and its months taken as
+        # fetched, so a project with errors gets no wide rows until a retry
+        if self.metrics and not errors:
+            self.metric_rows.extend(edit_metrics.metric_rows(project, results))
+
+        now = datetime.utcnow()
+        if errors:
+            self.finished.append(self.failed_state(project, "; ".join(errors), now))
+        else:
+            first, last = completed_state(
+                self.states.get(project), self.desired_first, self.desired_last
+            )
+            self.finished.append((project, first, last, "done", "", now))
+
+        if len(self.rows) + len(self.metric_rows) >= self.batch_size:
+            self.flush()
+
+    def failed_state(self, project, error, now):
+        """State row keeping the project's old interval, so its gaps are retried."""
+        self.failed[project] = error
+        state = self.states.get(project) or {}
+        return (
+            project,
+            state.get("first_month"),
+            state.get("last_month"),
+            "failed",
+            error[:1000],
+            now,
+        )
+
+    def flush(self):
+        lost = []
+        self.written += bulk_upsert(
+            self.conn,
+            self.table,
+            EDIT_COLUMNS,
+            self.rows,
+            ["edit_count"],
+            self.batch_size,
+            failed=lost,
+        )
+        lost_projects = {row[EDIT_COLUMNS.index("project")] for row in lost}
+        if self.metric_rows:
+            lost = []
+            bulk_upsert(
+                self.conn,
+                edit_metrics.METRICS_TABLE,
+                edit_metrics.COLUMNS,
+                self.metric_rows,
+                edit_metrics.METRIC_COLUMNS,
+                self.batch_size,
+                failed=lost,
+            )
+            lost_projects |= {row[0] for row in lost}
+
+        for detection_table in self.detection_tables:
+            self.rewind_watermarks(detection_table)
+
+        # A project's rows and state are buffered together, so the state of
+        # every project with uncommitted rows is in this flush
+        if lost_projects:
+            now = datetime.utcnow()
+            self.finished = [
                 (
-                    row["timestamp"].to_pydatetime(),
-                    int(row["edit_count"]),
-                    row["project"],
-                ),
+                    self.failed_state(row[0], "rows were not written", now)
+                    if row[0] in lost_projects
+                    else row
+                )
+                for row in self.finished
+            ]
+        bulk_upsert(
+            self.conn, self.state_table, STATE_COLUMNS, self.finished, STATE_COLUMNS[1:]
+        )
+        self.rows = []
+        self.metric_rows = []
+        self.finished = []
+
+    def rewind_watermarks(self, detection_table):
+        """
+        Move the detection watermark of every project with buffered months at
+        or before it to just before the earliest of those months. Incremental
+        detection then re-evaluates the backfilled months, and the later
+        ones whose windows now include them.
+        """
+        earliest = {}
+        for ts, _, project in self.rows:
+            # Month start, so a backfilled day also rewinds monthly detection
+            month = ts.replace(day=1)
+            earliest[project] = min(month, earliest.get(project, month))
+        if not earliest:
+            return
+        try:
+            with self.conn.cursor() as cursor:
+                cursor.executemany(
+                    f"""
+                    UPDATE {detection_table}
+                    SET last_timestamp = %s, updated_at = UTC_TIMESTAMP()
+                    WHERE project = %s AND last_timestamp >= %s
+                    """,
+                    [
+                        (ts - timedelta(seconds=1), project, ts)
+                        for project, ts in earliest.items()
+                    ],
+                )
+                rewound = cursor.rowcount
+        except pymysql.err.ProgrammingError as e:
+            # No detection run has created the table yet
+            logging.info(f"Detection watermarks not rewound: {e}")
+            return
+        if rewound:
+            logging.info(
+                f"Rewound the {detection_table} watermark of {rewound} projects "
+                f"with backfilled months"
+            )
+
+
+# --- Planning: one request per missing month range ---
+def plan_fetch(
+    conn,
+    projects,
+    desired_first,
+    desired_last,
+    planned_table,
+    state_table,
+    metrics=False,
+    claimed=False,
+    daily=False,
+):
+    """
+    Requests covering the missing months of `projects`, and the fetch
+    states they were planned from. `claimed` projects (a worker's batch)
+    only read their own stored months.
+    """
+    states = load_states(conn, state_table)
+    stored = load_stored_months(
+        conn, planned_table, desired_first, projects if claimed else None, daily
+    )
+    tasks = plan_tasks(projects, desired_first, desired_last, stored, states)
+    if metrics:
+        tasks = edit_metrics.metric_tasks(tasks)
+    return tasks, states
+
+
+def mark_running(conn, state_table, states, projects):
+    now = datetime.utcnow()
+    bulk_upsert(
+        conn,
+        state_table,
+        STATE_COLUMNS,
+        [
+            (
+                project,
+                states.get(project, {}).get("first_month"),
+                states.get(project, {}).get("last_month"),
+                "running",
+                "",
+                now,
+            )
+            for project in projects
+        ],
+        ["status", "updated_at"],
+    )
+
+
+async def fetch_and_store(tasks, writer, **fetch_kwargs):
+    """Stream fetch results into the writer as each project's gaps complete."""
+    pending = Counter(task.project for task in tasks)
+    results = defaultdict(list)
+
+    async for result in fetch_edit_counts_async(tasks, **fetch_kwargs):
+        project = result.task.project
+        results[project].append(result)
+        pending[project] -= 1
+        if not pending[project]:
+            await asyncio.to_thread(writer.add_project, project, results.pop(project))
+
+    await asyncio.to_thread(writer.flush)
+
+
+# --- Worker mode: fetch batches of projects leased from the work queue ---
+def run_worker(queue, writer, plan, fetch_kwargs, claim_size, lease_seconds):
+    """
+    Claim batches of projects until the queue is empty. Each batch is
+    planned (`plan(projects)` returns tasks and states) against the stored
+    rows at claim time, fetched and written under a heartbeat, then marked
+    done, or handed back to the queue if the API failed for a project.
+    """
+    owner = worker_id()
+    while True:
+        items = queue.claim(owner, claim_size, lease_seconds)
+        if not items:
+            break
+        with queue.keep_alive(owner, lease_seconds):
+            tasks, states = plan([item.project for item in items])
+            writer.states = states
+            mark_running(
+                writer.conn,
+                writer.state_table,
+                states,
+                sorted({task.project for task in tasks}),
             )
+            asyncio.run(fetch_and_store(tasks, writer, **fetch_kwargs))
+
+        failed = [item for item in items if item.project in writer.failed]
+        for item in failed:
+            queue.fail(owner, [item], writer.failed.pop(item.project))
+        queue.complete(owner, [item for item in items if item not in failed])
+        logging.info(
+            f"{owner}: {len(items) - len(failed)} projects done, "
+            f"{len(failed)} failed ({len(tasks)} requests)"
+        )
+    logging.info(f"{owner}: queue drained ({queue.counts()})")
+
+
+def main(
+    base_url=API_BASE_URL,
+    concurrency=DEFAULT_CONCURRENCY,
+    rate=DEFAULT_RATE,
+    batch_size=DEFAULT_BATCH_SIZE,
+    backfill_months=1,
+    sitematrix_url=SITEMATRIX_URL,
+    record=None,
+    refresh_snapshot=True,
+    granularity="monthly",
+    metrics=False,
+    worker=False,
+    claim_size=DEFAULT_CLAIM_SIZE,
+    lease_seconds=DEFAULT_LEASE_SECONDS,
+    queue_sqlite=None,
+    schedule=False,
+):
+    if metrics and granularity != "monthly":
+        raise ValueError("Metric dimensions are fetched monthly only")
+    table, state_table, detection_tables = GRANULARITY_TABLES[granularity]
+    # Gaps are planned from edit_metrics, whose rows hold every dimension
+    planned_table = edit_metrics.METRICS_TABLE if metrics else table
+    if metrics:
+        state_table = edit_metrics.METRICS_STATE_TABLE
+    recorder = HttpArchive() if record else None
+    projects = get_projects(sitematrix_url, recorder)
+    desired_first, desired_last = desired_month_range(backfill_months)
+    if schedule:
+        # Months deferred by earlier runs must stay inside the planned range
+        desired_first = min(
+            desired_first,
+            add_months(desired_last, 1 - fetch_scheduler.LOOKBACK_MONTHS),
+        )
+
+    # --- Connect to Toolforge DB ---
+    conn = pymysql.connect(
+        host="tools.db.svc.wikimedia.cloud",
+        user=user,
+        password=password,
+        database=DB_NAME,
+        charset="utf8mb4",
+        autocommit=True,
+    )
+    cursor = conn.cursor()
+    ensure_tables(cursor, granularity, metrics)
+
+    # --- Plan one request per missing month range ---
+    daily = granularity == "daily"
+    tasks, states = plan_fetch(
+        conn,
+        projects,
+        desired_first,
+        desired_last,
+        planned_table,
+        state_table,
+        metrics,
+        daily=daily,
+    )
+    interrupted = sum(1 for state in states.values() if state["status"] == "running")
+    if interrupted:
+        logging.info(f"Resuming after an interrupted run ({interrupted} projects)")
+    if schedule:
+        tiers, activity = fetch_scheduler.refresh_tiers(
+            conn,
+            projects,
+            desired_last,
+            states,
+            source_table=ACTIVITY_TABLES[granularity],
+        )
+        tasks, deferred = fetch_scheduler.schedule(tasks, tiers, activity, desired_last)
+        fetch_scheduler.report(tasks, deferred, tiers)
+    planned = list(dict.fromkeys(task.project for task in tasks))  # fetch order
+    logging.info(
+        f"{len(tasks)} requests planned for {len(planned)} of {len(projects)} "
+        f"projects between {desired_first:%Y-%m} and {desired_last:%Y-%m}, "
+        f"{granularity}{' metrics' if metrics else ''} "
+        f"({concurrency} connections, {rate} req/s)"
+    )
+
+    # --- Fetch concurrently, writing as projects complete ---
+    writer = IngestWriter(
+        conn,
+        states,
+        desired_first,
+        desired_last,
+        batch_size,
+        table,
+        state_table,
+        metrics,
+        detection_tables,
+    )
+    fetch_kwargs = dict(
+        base_url=base_url,
+        concurrency=concurrency,
+        rate=rate,
+        recorder=recorder,
+        granularity=granularity,
+    )
+    if worker:
+        queue = WorkQueue(connect_queue(queue_sqlite))
+        queue.ensure_table()
+        queue.prune()
+        enqueued = queue.enqueue(
+            WorkItem(project, desired_first, desired_last) for project in planned
+        )
+        logging.info(
+            f"Enqueued {enqueued} new projects; claiming work as {worker_id()}"
+        )
+        run_worker(
+            queue,
+            writer,
+            lambda batch: plan_fetch(
+                conn,
+                batch,
+                desired_first,
+                desired_last,
+                planned_table,
+                state_table,
+                metrics,
+                claimed=True,
+                daily=daily,
+            ),
+            fetch_kwargs,
+            claim_size,
+            lease_seconds,
+        )
+    else:
+        mark_running(conn, state_table, states, planned)
+        asyncio.run(fetch_and_store(tasks, writer, **fetch_kwargs))
+    if recorder is not None:
+        recorder.save(record)
+    logging.info(f"All data saved successfully ({writer.written} rows).")
+
+    # --- Refresh the local Parquet snapshot and edit matrix ---
+    if refresh_snapshot:
+        uri = mysql_uri(user, password)
+        try:
+            snapshot.refresh_changed(table, writer.updated, uri)
+            if metrics:
+                snapshot.refresh_changed(
+                    edit_metrics.METRICS_TABLE, writer.updated, uri
+                )
         except Exception as e:
-            logging.error(f"DB insert failed for {project}: {e}")
-            continue
+            logging.error(f"Snapshot refresh failed: {e}")
+        # The matrix holds monthly counts only. Concurrent workers would race
+        # on growing it, so after a worker run it is rebuilt separately.
+        if granularity == "monthly" and not worker:
+            try:
+                matrix_store.refresh(writer.updated, desired_first, uri)
+            except Exception as e:
+                logging.error(f"Edit matrix refresh failed: {e}")
+
+    # --- Cleanup ---
+    cursor.close()
+    conn.close()
 
-logging.info("All data saved successfully.")
 
-# --- Cleanup ---
-cursor.close()
-conn.close()
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Fetch missing edit counts, last month by default."
+    )
+    parser.add_argument("--base-url", default=API_BASE_URL)
+    parser.add_argument("--sitematrix-url", default=SITEMATRIX_URL)
+    parser.add_argument(
+        "--record",
+        metavar="PATH",
+        help="Save every API response to a gzip archive for offline replay.",
+    )
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument(
+        "--rate", type=float, default=DEFAULT_RATE, help="Requests per second."
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="Rows per multi-row upsert transaction.",
+    )
+    parser.add_argument(
+        "--backfill-months",
+        type=int,
+        default=1,
+        help="Number of complete months back to fill in (e.g. 36 for 3 years).",
+    )
+    parser.add_argument(
+        "--no-snapshot",
+        action="store_true",
+        help="Don't refresh the local Parquet snapshot and edit matrix after "
+        "ingesting.",
+    )
+    parser.add_argument(
+        "--granularity",
+        choices=list(GRANULARITY_TABLES),
+        default="monthly",
+        help="Fetch monthly totals into edit_counts, or daily counts into "
+        "edit_counts_daily (complete months of days, ~30x the rows).",
+    )
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        help="Also fetch edits of all page types, by users and by bots, and "
+        "editors, in the same pass, into one edit_metrics row per month.",
+    )
+    parser.add_argument(
+        "--worker",
+        action="store_true",
+        help="Run as one of several concurrent workers: enqueue the planned "
+        "projects in the shared fetch_queue table and fetch leased batches "
+        "of them until it is empty.",
+    )
+    parser.add_argument(
+        "--claim-size",
+        type=int,
+        default=DEFAULT_CLAIM_SIZE,
+        help="Projects leased per claim in --worker mode.",
+    )
+    parser.add_argument(
+        "--lease-seconds",
+        type=int,
+        default=DEFAULT_LEASE_SECONDS,
+        help="Lease length; heartbeats renew it every third of it.",
+    )
+    parser.add_argument(
+        "--queue-sqlite",
+        metavar="PATH",
+        help="Keep the work queue in a local SQLite file instead of ToolsDB.",
+    )
+    parser.add_argument(
+        "--schedule",
+        action="store_true",
+        help="Fetch projects by activity tier (fetch_scheduler.py): busy ones "
+        "first, quiet and dormant ones only every few months.",
+    )
+    args = parser.parse_args()
+    main(
+        base_url=args.base_url,
+        concurrency=args.concurrency,
+        rate=args.rate,
+        batch_size=args.batch_size,
+        backfill_months=args.backfill_months,
+        sitematrix_url=args.sitematrix_url,
+        record=args.record,
+        refresh_snapshot=not args.no_snapshot,
+        granularity=args.granularity,
+        metrics=args.metrics,
+        worker=args.worker,
+        claim_size=args.claim_size,
+        lease_seconds=args.lease_seconds,
+        queue_sqlite=args.queue_sqlite,
+        schedule=args.schedule,
+    )
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+
+import argparse
+import logging
+import zlib
+from collections import Counter, namedtuple
+from datetime import datetime
+
+import pymysql
+
+from db import DB_HOST, DB_NAME, bulk_upsert, load_credentials
+from ingest_planner import STATE_TABLE, add_months, load_states
+
+ACTIVITY_TABLE = "project_activity"
+ACTIVITY_COLUMNS = ["project", "tier", "recent_edits", "last_active", "updated_at"]
+SOURCE_TABLE = "edit_counts"
+
+WINDOW_MONTHS = 12  # activity is measured over the last year
+BUSY_MIN = 1000  # mean monthly edits of a busy project
+ACTIVE_MIN = 10  # mean monthly edits of an active project
+
+# Fetch order (rank) and months between fetches of each tier. A deferred
+# project's missing months are fetched later in one ranged request, and
+# incremental detection evaluates them then, so alerts of quiet wikis are
+# delayed, never lost.
+Tier = namedtuple("Tier", ["rank", "interval"])
+TIERS = {
+    "busy": Tier(0, 1),
+    "active": Tier(1, 1),
+    "new": Tier(2, 1),  # no history yet: fetched every run until it has one
+    "quiet": Tier(3, 3),
+    "dormant": Tier(4, 6),
+}
+# Months a scheduled run looks back, so deferred months are never forgotten
+LOOKBACK_MONTHS = max(tier.interval for tier in TIERS.values())
+
+
+def months_between(first, last):
+    return (last.year - first.year) * 12 + last.month - first.month
+
+
+# --- Activity statistics ---
+def load_activity(conn, desired_last, source_table=SOURCE_TABLE):
+    """
+    {project: (edits, last active month)} over the WINDOW_MONTHS months up to
+    `desired_last`, in one range read of the timestamp-first primary key.
+    """
+    since = add_months(desired_last, 1 - WINDOW_MONTHS)
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT project, SUM(edit_count),
+                   MAX(CASE WHEN edit_count > 0 THEN timestamp END)
+            FROM {source_table}
+            WHERE timestamp >= %s
+            GROUP BY project
+            """,
+            (since,),
+        )
+        return {
+            project: (int(edits or 0), last_active)
+            for project, edits, last_active in cursor.fetchall()
+        }
+
+
+def assign_tier(activity, state):
+    """Tier of a project from its (edits, last active) and its fetch state."""
+    if activity is None and not (state and state["last_month"]):
+        return "new"
+    edits = activity[0] if activity else 0
+    if edits >= BUSY_MIN * WINDOW_MONTHS:
+        return "busy"
+    if edits >= ACTIVE_MIN * WINDOW_MONTHS:
+        return "active"
+    return "quiet" if edits > 0 else "dormant"
+
+
+def assign_tiers(projects, activity, states):
+    return {
+        project: assign_tier(activity.get(project), states.get(project))
+        for project in projects
+    }
+
+
+# --- Scheduling ---
+def schedule(tasks, tiers, activity, desired_last):
+    """
+    Split planned `tasks` into (due, deferred). A project is due in the
+    months matching its phase (a hash of its name) modulo its tier's
+    interval, which spreads each tier evenly over the interval, and in any
+    case once its oldest missing month is a full interval old. Due tasks
+    are ordered busiest first, so the fetcher starts on them.
+    """
+    first_missing = {}
+    for task in tasks:
+        start = datetime.strptime(task.start, "%Y%m%d").date().replace(day=1)
+        first_missing[task.project] = min(start, first_missing.get(task.project, start))
+
+    month_number = desired_last.year * 12 + desired_last.month - 1
+
+    def is_due(project):
+        interval = TIERS[tiers.get(project, "new")].interval
+        if months_between(first_missing[project], desired_last) + 1 >= interval:
+            return True
+        return month_number % interval == zlib.crc32(project.encode()) % interval
+
+    def priority(task):
+        edits = activity.get(task.project, (0, None))[0]
+        return TIERS[tiers.get(task.project, "new")].rank, -edits, task.project
+
+    due = sorted((task for task in tasks if is_due(task.project)), key=priority)
+    deferred = [task for task in tasks if not is_due(task.project)]
+    return due, deferred
+
+
+def report(due, deferred, tiers):
+    """Log the requests this run saved, by tier."""
+    projects = Counter(
+        tiers.get(project, "new") for project in {t.project for t in deferred}
+    )
+    by_tier = ", ".join(f"{tier} {n}" for tier, n in sorted(projects.items()))
+    total = len(due) + len(deferred)
+    logging.info(
+        f"Scheduler: {len(due)} of {total} requests due, {len(deferred)} saved "
+        f"({100 * len(deferred) / total if total else 0:.0f}%) by deferring "
+        f"{sum(projects.values())} projects ({by_tier or 'none'})"
+    )
+    return len(deferred)
+
+
+def steady_state_requests(tiers):
+    """Requests per year of monthly runs: (without the scheduler, with it)."""
+    counts = Counter(tiers.values())
+    return 12 * sum(counts.values()), sum(
+        n * 12 / TIERS[tier].interval for tier, n in counts.items()
+    )
+
+
+# --- Storage ---
+def ensure_table(cursor):
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS {ACTIVITY_TABLE} (
+        project VARCHAR(255) PRIMARY KEY,
+        tier VARCHAR(16),
+        recent_edits BIGINT,
+        last_active DATETIME,
+        updated_at DATETIME
+    )
+    """)
+
+
+def store_activity(conn, tiers, activity):
+    now = datetime.utcnow()
+    rows = [
+        (project, tier, *activity.get(project, (0, None)), now)
+        for project, tier in tiers.items()
+    ]
+    bulk_upsert(conn, ACTIVITY_TABLE, ACTIVITY_COLUMNS, rows, ACTIVITY_COLUMNS[1:])
+
+
+def refresh_tiers(
+    conn,
+    projects,
+    desired_last,
+    states=None,
+    state_table=STATE_TABLE,
+    source_table=SOURCE_TABLE,
+):
+    """
+    Recompute and store every project's tier from the monthly counts in
+    `source_table`. Returns (tiers, activity).
+    """
+    if states is None:
+        states = load_states(conn, state_table)
+    activity = load_activity(conn, desired_last, source_table)
+    tiers = assign_tiers(projects, activity, states)
+    with conn.cursor() as cursor:
+        ensure_table(cursor)
+    store_activity(conn, tiers, activity)
+    return tiers, activity
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    parser = argparse.ArgumentParser(
+        description="Recompute fetch tiers from edit_counts and estimate the "
+        "requests they save."
+    )
+    parser.parse_args()
+
+    user, password = load_credentials()
+    conn = pymysql.connect(
+        host=DB_HOST,
+        user=user,
+        password=password,
+        database=DB_NAME,
+        charset="utf8mb4",
+        autocommit=True,
+    )
+    # Projects the cron has fetched so far, tiered as of last month
+    states = load_states(conn)
+    last = add_months(datetime.utcnow().date().replace(day=1), -1)
+    tiers, _ = refresh_tiers(conn, list(states), last, states)
+    conn.close()
+
+    for tier, n in sorted(Counter(tiers.values()).items(), key=lambda x: TIERS[x[0]]):
+        print(f"{tier}: {n} projects, fetched every {TIERS[tier].interval} month(s)")
+    without, with_schedule = steady_state_requests(tiers)
+    if without:
+        print(
+            f"Monthly runs: {without:.0f} requests a year without the scheduler, "
+            f"{with_schedule:.0f} with it "
+            f"({100 * (1 - with_schedule / without):.0f}% fewer)"
+        )
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import logging
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pymysql
+
+from db import DB_HOST, DB_NAME, bulk_upsert, load_credentials
+from matrix_store import MATRIX_DIR, EditMatrix
+from peak_detection import DEFAULT_THRESHOLD
+
+EVENTS_TABLE = "global_events"
+EVENT_COLUMNS = [
+    "month",
+    "peak_count",
+    "project_count",
+    "expected",
+    "z_score",
+    "mean_score",
+    "families",
+    "projects",
+    "detected_at",
+]
+
+DEFAULT_MIN_Z = 4.0
+DEFAULT_MIN_PROJECTS = 10
+BASELINE_MONTHS = 36
+
+
+def project_family(project):
+    """Family of a project, e.g. "en.wikipedia.org" -> "wikipedia.org"."""
+    return project.split(".", 1)[1] if "." in project else project
+
+
+# --- Detection ---
+def detect_events(
+    matrix,
+    threshold_percentage=DEFAULT_THRESHOLD,
+    min_z=DEFAULT_MIN_Z,
+    min_projects=DEFAULT_MIN_PROJECTS,
+    baseline_months=BASELINE_MONTHS,
+):
+    """
+    Months in which unusually many projects peak together.
+
+    Every cell of the edit matrix is scored at once (edits / 3-year rolling
+    mean, see `EditMatrix.rolling_stats`). For each month, the number of
+    peaking projects k among the n projects with a score is compared with a
+    binomial baseline: the median share of peaking projects over the
+    preceding `baseline_months` months. Months whose z-score
+    (k - n p) / sqrt(n p (1 - p)) reaches `min_z`, with at least
+    `min_projects` peaks, become events listing the co-spiking projects by
+    descending score.
+    """
+    score = matrix.rolling_stats(threshold_percentage)["score"]
+    scored = ~np.isnan(score)
+    peaks = scored & (score >= 1 + threshold_percentage)
+    peak_count = peaks.sum(axis=0)
+    project_count = scored.sum(axis=0)
+    months = matrix.months()
+
+    rate = pd.Series(
+        np.divide(
+            peak_count,
+            project_count,
+            out=np.full(len(months), np.nan),
+            where=project_count > 0,
+        ),
+        index=months,
+    )
+    baseline = (
+        rate.shift(1)
+        .rolling(baseline_months, min_periods=12)
+        .median()
+        .fillna(rate.median())
+        .clip(lower=1e-3, upper=1 - 1e-3)
+        .to_numpy()
+    )
+    expected = project_count * baseline
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z_score = (peak_count - expected) / np.sqrt(
+            project_count * baseline * (1 - baseline)
+        )
+
+    flagged = np.flatnonzero((z_score >= min_z) & (peak_count >= min_projects))
+    events = []
+    for col in flagged:
+        rows = np.flatnonzero(peaks[:, col])
+        rows = rows[np.argsort(-score[rows, col], kind="stable")]
+        projects = matrix.projects[rows].tolist()
+        events.append(
+            {
+                "month": months[col],
+                "peak_count": int(peak_count[col]),
+                "project_count": int(project_count[col]),
+                "expected": float(expected[col]),
+                "z_score": float(z_score[col]),
+                "mean_score": float(score[rows, col].mean()),
+                "families": dict(
+                    Counter(project_family(project) for project in projects)
+                ),
+                "projects": projects,
+            }
+        )
+    return pd.DataFrame(events, columns=EVENT_COLUMNS[:-1])
+
+
+# --- Storage ---
+def ensure_table(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {EVENTS_TABLE} (
+            month DATETIME PRIMARY KEY,
+            peak_count INT,
+            project_count INT,
+            expected DOUBLE,
+            z_score DOUBLE,
+            mean_score DOUBLE,
+            families TEXT,
+            projects MEDIUMTEXT,
+            detected_at DATETIME
+        )
+        """)
+
+
+def store_events(conn, events):
+    """Replace the stored events with `events` (the full recomputed set)."""
+    detected_at = datetime.utcnow().replace(microsecond=0)
+    rows = [
+        (
+            event.month.to_pydatetime(),
+            event.peak_count,
+            event.project_count,
+            event.expected,
+            event.z_score,
+            event.mean_score,
+            json.dumps(event.families),
+            json.dumps(event.projects),
+            detected_at,
+        )
+        for event in events.itertuples(index=False)
+    ]
+    written = bulk_upsert(conn, EVENTS_TABLE, EVENT_COLUMNS, rows, EVENT_COLUMNS[1:])
+    # Months that no longer qualify (e.g. after a backfill) are dropped
+    if written == len(rows):
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {EVENTS_TABLE} WHERE detected_at < %s", (detected_at,)
+            )
+    logging.info(f"Stored {written} global events")
+
+
+def load_events(conn, start=None, end=None):
+    query = f"SELECT * FROM {EVENTS_TABLE}"
+    params = ()
+    if start is not None:
+        query += " WHERE month BETWEEN %s AND %s"
+        params = (start, end)
+    events = pd.read_sql(query + " ORDER BY month", conn, params=params)
+    for column in ("families", "projects"):
+        events[column] = events[column].map(json.loads)
+    return events
+
+
+def main(
+    threshold_percentage=DEFAULT_THRESHOLD,
+    min_z=DEFAULT_MIN_Z,
+    min_projects=DEFAULT_MIN_PROJECTS,
+    matrix_dir=MATRIX_DIR,
+):
+    matrix = EditMatrix.load(matrix_dir)
+    events = detect_events(matrix, threshold_percentage, min_z, min_projects)
+    logging.info(
+        f"{len(events)} global events in {matrix.counts.shape[1]} months "
+        f"of {matrix.counts.shape[0]} projects"
+    )
+
+    user, password = load_credentials()
+    conn = pymysql.connect(
+        host=DB_HOST,
+        user=user,
+        password=password,
+        database=DB_NAME,
+        charset="utf8mb4",
+        autocommit=True,
+    )
+    ensure_table(conn)
+    store_events(conn, events)
+    conn.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    parser = argparse.ArgumentParser(
+        description="Detect months in which many wikis peak at the same time."
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD * 100,
+        help="Percent over the 3-year rolling mean that counts as a peak.",
+    )
+    parser.add_argument(
+        "--min-z",
+        type=float,
+        default=DEFAULT_MIN_Z,
+        help="Z-score of the peak count over its baseline that makes an event.",
+    )
+    parser.add_argument(
+        "--min-projects",
+        type=int,
+        default=DEFAULT_MIN_PROJECTS,
+        help="Fewest co-spiking projects that make an event.",
+    )
+    parser.add_argument("--matrix-dir", default=MATRIX_DIR)
+    args = parser.parse_args()
+    main(args.threshold / 100, args.min_z, args.min_projects, args.matrix_dir)
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import re
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+from aiohttp import web
+
+from edit_fetcher import (
+    DEFAULT_CONCURRENCY,
+    DEFAULT_RATE,
+    FetchTask,
+    Metric,
+    fetch_edit_counts_async,
+)
+
+# --- Setup logging ---
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+# edits/aggregate and editors/aggregate requests, as built by Metric.path
+AGGREGATE_PATH = re.compile(
+    r"^.*/metrics/(?P<kind>edits|editors)/aggregate/(?P<project>[^/]+)/"
+    r"(?P<editor_type>[^/]+)/(?P<page_type>[^/]+)(?:/all-activity-levels)?/"
+    r"(?P<granularity>[^/]+)/(?P<start>\d{8})/(?P<end>\d{8})$"
+)
+
+
+def archive_key(url):
+    """Archive entries are keyed by path and query, so replay works on any host."""
+    parts = urlsplit(url)
+    return parts.path + (f"?{parts.query}" if parts.query else "")
+
+
+# --- Archive file ---
+class HttpArchive:
+    """
+    Gzip-compressed JSON-lines archive of HTTP responses.
+
+    Record mode: pass the archive as `recorder` to the fetcher or
+    `get_projects()`; every response is kept and written out by `save()`.
+    Replay mode: `HttpArchive.load(path)` and serve it with `replay_app()`.
+    """
+
+    def __init__(self, entries=None):
+        self.entries = entries or {}
+
+    def record(self, url, status, body, content_type="application/json"):
+        self.entries[archive_key(url)] = {
+            "status": status,
+            "content_type": content_type,
+            "body": body,
+        }
+
+    def save(self, path):
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            for key, entry in self.entries.items():
+                f.write(json.dumps({"key": key, **entry}) + "\n")
+        logging.info(f"Saved {len(self.entries)} responses to {path}")
+
+    @classmethod
+    def load(cls, path):
+        entries = {}
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                entries[entry.pop("key")] = entry
+        return cls(entries)
+
+    def fetch_tasks(self):
+        """
+        The aggregate requests in the archive as fetcher tasks, by granularity.
+        Each task's metric rebuilds the recorded path, so replay repeats the
+        recorded mix of editor types, page types and editor counts.
+        """
+        tasks = defaultdict(list)
+        for key in self.entries:
+            match = AGGREGATE_PATH.match(key.split("?")[0])
+            if match:
+                metric = Metric(
+                    match["kind"],
+                    kind=match["kind"],
+                    editor_type=match["editor_type"],
+                    page_type=match["page_type"],
+                )
+                tasks[match["granularity"]].append(
+                    FetchTask(match["project"], match["start"], match["end"], metric)
+                )
+        return dict(tasks)
+
+
+# --- Replay server ---
+def replay_app(archive, latency=0.0):
+    """aiohttp application answering every archived path after `latency` seconds."""
+
+    async def handler(request):
+        await asyncio.sleep(latency)
+        entry = archive.entries.get(request.path_qs)
+        if entry is None:
+            logging.warning(f"Not in archive: {request.path_qs}")
+            return web.Response(status=404, text="Not in archive")
+        return web.Response(
+            status=entry["status"],
+            text=entry["body"],
+            content_type=entry["content_type"],
+        )
+
+    app = web.Application()
+    app.router.add_route("GET", "/{tail:.*}", handler)
+    return app
+
+
+async def start_replay_server(archive, host="127.0.0.1", port=8080, latency=0.0):
+    runner = web.AppRunner(replay_app(archive, latency), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+# --- Offline ingest benchmark ---
+async def benchmark(archive, latency, concurrency, rate, port):
+    tasks = archive.fetch_tasks()
+    count = sum(len(group) for group in tasks.values())
+    runner = await start_replay_server(archive, port=port, latency=latency)
+    try:
+        started = time.perf_counter()
+        ok = 0
+        for granularity, group in tasks.items():
+            async for result in fetch_edit_counts_async(
+                group,
+                base_url=f"http://127.0.0.1:{port}/api/rest_v1/metrics/edits/aggregate",
+                granularity=granularity,
+                concurrency=concurrency,
+                rate=rate,
+            ):
+                ok += result.ok
+        elapsed = time.perf_counter() - started
+    finally:
+        await runner.cleanup()
+
+    logging.info(
+        f"Replayed {count} requests ({ok} ok) in {elapsed:.2f}s: "
+        f"{count / elapsed:.1f} req/s at {latency * 1000:.0f} ms latency, "
+        f"concurrency {concurrency}, rate {rate}"
+    )
+
+
+async def serve(archive, host, port, latency):
+    await start_replay_server(archive, host, port, latency)
+    logging.info(
+        f"Replaying {len(archive.entries)} responses on http://{host}:{port} "
+        f"with {latency * 1000:.0f} ms latency"
+    )
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Replay a recorded HTTP archive, or benchmark the fetcher on it."
+    )
+    parser.add_argument("command", choices=["serve", "bench"])
+    parser.add_argument("archive", help="Archive written by --record.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds added to each response."
+    )
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE)
+    args = parser.parse_args()
+
+    archive = HttpArchive.load(args.archive)
+    if args.command == "serve":
+        asyncio.run(serve(archive, args.host, args.port, args.latency))
+    else:
+        asyncio.run(
+            benchmark(archive, args.latency, args.concurrency, args.rate, args.port)
+        )
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+import calendar
+from datetime import date
+
+from edit_fetcher import FetchTask
+
+STATE_TABLE = "fetch_state"
+
+STATE_COLUMNS = [
+    "project",
+    "first_month",
+    "last_month",
+    "status",
+    "message",
+    "updated_at",
+]
+
+
+# --- Month arithmetic ---
+def month_start(d):
+    return date(d.year, d.month, 1)
+
+
+def add_months(d, months):
+    index = d.year * 12 + d.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_end(d):
+    return date(d.year, d.month, calendar.monthrange(d.year, d.month)[1])
+
+
+def month_range(first, last):
+    """Every month start from `first` to `last`, inclusive."""
+    months = []
+    current = month_start(first)
+    while current <= last:
+        months.append(current)
+        current = add_months(current, 1)
+    return months
+
+
+def contiguous_ranges(months):
+    """Collapse month starts into sorted (first, last) runs of consecutive months."""
+    ranges = []
+    for month in sorted(months):
+        if ranges and add_months(ranges[-1][1], 1) == month:
+            ranges[-1] = (ranges[-1][0], month)
+        else:
+            ranges.append((month, month))
+    return ranges
+
+
+# --- Planning ---
+def plan_missing_ranges(desired_first, desired_last, stored_months, state=None):
+    """
+    Return the contiguous month ranges of [desired_first, desired_last] that
+    still need fetching for one project.
+
+    A month is done if `edit_counts` already has it, or if it lies inside the
+    [first_month, last_month] interval the project's state row records as
+    fetched (months the API had no data for are not refetched every run).
+    """
+    covered_first = state["first_month"] if state else None
+    covered_last = state["last_month"] if state else None
+
+    missing = [
+        month
+        for month in month_range(desired_first, desired_last)
+        if month not in stored_months
+        and not (covered_first is not None and covered_first <= month <= covered_last)
+    ]
+    return contiguous_ranges(missing)
+
+
+def plan_tasks(projects, desired_first, desired_last, stored, states):
+    """One FetchTask per contiguous gap of every project."""
+    tasks = []
+    for project in sorted(projects):
+        for first, last in plan_missing_ranges(
+            desired_first,
+            desired_last,
+            stored.get(project, set()),
+            states.get(project),
+        ):
+            tasks.append(
+                FetchTask(
+                    project,
+                    first.strftime("%Y%m%d"),
+                    month_end(last).strftime("%Y%m%d"),
+                )
+            )
+    return tasks
+
+
+def completed_state(state, desired_first, desired_last):
+    """Covered interval once every gap of [desired_first, desired_last] is fetched."""
+    if not state or state["first_month"] is None:
+        return desired_first, desired_last
+    # The old interval and the desired range are only merged when they touch,
+    # so the recorded interval never spans months that were never fetched.
+    if desired_first <= add_months(state["last_month"], 1) and (
+        state["first_month"] <= add_months(desired_last, 1)
+    ):
+        return (
+            min(state["first_month"], desired_first),
+            max(state["last_month"], desired_last),
+        )
+    return desired_first, desired_last
+
+
+# --- State table ---
+def ensure_state_table(cursor, table=STATE_TABLE):
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS {table} (
+        project VARCHAR(255) PRIMARY KEY,
+        first_month DATE,
+        last_month DATE,
+        status VARCHAR(20),
+        message TEXT,
+        updated_at DATETIME
+    )
+    """)
+
+
+def load_states(conn, table=STATE_TABLE):
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT project, first_month, last_month, status FROM {table}")
+        return {
+            project: {"first_month": first, "last_month": last, "status": status}
+            for project, first, last, status in cursor.fetchall()
+        }
+
+
+def load_stored_months(conn, source_table, desired_first, projects=None, daily=False):
+    """
+    Stored months since `desired_first`, of `projects` only when given. In a
+    `daily` table a month only counts once all of its days are stored, so a
+    month left partial by a failed batch is planned again (fully fetched
+    months with days the API had no data for are covered by the state).
+    """
+    stored = {}
+    params = (desired_first,)
+    only = ""
+    if projects is not None:
+        if not projects:
+            return stored
+        only = f"AND project IN ({', '.join(['%s'] * len(projects))})"
+        params += tuple(projects)
+    with conn.cursor() as cursor:
+        # One row per stored month, also for daily tables
+        cursor.execute(
+            f"""
+            SELECT project, MIN(timestamp), COUNT(DISTINCT DATE(timestamp))
+            FROM {source_table}
+            WHERE timestamp >= %s {only}
+            GROUP BY project, YEAR(timestamp), MONTH(timestamp)
+            """,
+            params,
+        )
+        for project, timestamp, days in cursor.fetchall():
+            if daily and days < month_end(timestamp).day:
+                continue
+            stored.setdefault(project, set()).add(month_start(timestamp))
+    return stored
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+
+import argparse
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+from pymysql.converters import escape_string
+
+from arrow_loader import DEFAULT_PARTITIONS, load_arrow, to_pandas
+from peak_detection import DEFAULT_THRESHOLD
+
+MATRIX_DIR = os.getenv(
+    "EDIT_MATRIX_DIR", "/data/project/community-activity-alerts-system/matrix"
+)
+COUNTS_FILE = "counts.npy"
+INDEX_FILE = "index.npz"
+MISSING = -1
+WINDOW_MONTHS = 36  # [t - 3 years, t] on month starts is t and the 36 months before
+
+
+def month_numbers(timestamps):
+    """Months since 0000-01 of a timestamp Series/array, as int64."""
+    index = pd.DatetimeIndex(timestamps)
+    return index.year.to_numpy(np.int64) * 12 + index.month.to_numpy(np.int64) - 1
+
+
+class EditMatrix:
+    """
+    Monthly edit counts as a dense int32 projects x months grid, MISSING (-1)
+    where a project has no row. Row i is `projects[i]`, column j is month
+    `first_month + j`.
+
+    Persisted as `counts.npy` (memory-mappable, updated in place when the
+    shape does not change) and `index.npz` (project names and first month).
+    """
+
+    def __init__(self, counts, projects, first_month):
+        self.counts = counts
+        self.projects = np.asarray(projects, dtype=str)
+        self.first_month = int(first_month)
+        self.rows = {project: i for i, project in enumerate(self.projects)}
+
+    # --- Construction ---
+    @classmethod
+    def from_frame(cls, df):
+        """Build from long-format (project, timestamp, edit_count) rows."""
+        projects = np.unique(df["project"].astype(str).to_numpy())
+        months = month_numbers(df["timestamp"])
+        first_month = int(months.min()) if len(months) else 0
+        width = int(months.max()) - first_month + 1 if len(months) else 0
+        matrix = cls(
+            np.full((len(projects), width), MISSING, dtype=np.int32),
+            projects,
+            first_month,
+        )
+        matrix.counts[
+            np.searchsorted(projects, df["project"].astype(str).to_numpy()),
+            months - first_month,
+        ] = df["edit_count"].to_numpy()
+        return matrix
+
+    @classmethod
+    def load(cls, path=MATRIX_DIR, mmap_mode="r"):
+        counts = np.load(os.path.join(path, COUNTS_FILE), mmap_mode=mmap_mode)
+        with np.load(os.path.join(path, INDEX_FILE)) as index:
+            return cls(counts, index["projects"], index["first_month"])
+
+    def save(self, path=MATRIX_DIR):
+        os.makedirs(path, exist_ok=True)
+        for name, write in (
+            (COUNTS_FILE, lambda f: np.save(f, np.asarray(self.counts))),
+            (
+                INDEX_FILE,
+                lambda f: np.savez(
+                    f, projects=self.projects, first_month=self.first_month
+                ),
+            ),
+        ):
+            tmp_path = os.path.join(path, f"{name}.tmp")
+            with open(tmp_path, "wb") as f:
+                write(f)
+            os.replace(tmp_path, os.path.join(path, name))
+
+    # --- Updates ---
+    def covers(self, df):
+        months = month_numbers(df["timestamp"]) - self.first_month
+        return (
+            df["project"].astype(str).isin(self.rows).all()
+            and (months >= 0).all()
+            and (months < self.counts.shape[1]).all()
+        )
+
+    def grow(self, df):
+        """A copy extended with the projects and months of `df`, not filled in."""
+        projects = np.union1d(self.projects, df["project"].astype(str).unique())
+        months = month_numbers(df["timestamp"])
+        first_month = min(self.first_month, int(months.min()))
+        last_month = max(self.first_month + self.counts.shape[1] - 1, int(months.max()))
+        counts = np.full(
+            (len(projects), last_month - first_month + 1), MISSING, dtype=np.int32
+        )
+        offset = self.first_month - first_month
+        counts[
+            np.searchsorted(projects, self.projects),
+            offset : offset + self.counts.shape[1],
+        ] = self.counts
+        return EditMatrix(counts, projects, first_month)
+
+    def set_cells(self, df):
+        rows = np.fromiter(
+            (self.rows[project] for project in df["project"].astype(str)),
+            dtype=np.int64,
+            count=len(df),
+        )
+        self.counts[rows, month_numbers(df["timestamp"]) - self.first_month] = df[
+            "edit_count"
+        ].to_numpy()
+
+    # --- Views ---
+    def months(self):
+        return pd.period_range(
+            pd.Period(
+                year=self.first_month // 12, month=self.first_month % 12 + 1, freq="M"
+            ),
+            periods=self.counts.shape[1],
+        ).to_timestamp()
+
+    def family_mask(self, suffix):
+        """Rows of every project of a family, e.g. "wikipedia.org"."""
+        return np.char.endswith(self.projects, suffix)
+
+    def to_frame(self):
+        rows, cols = np.nonzero(self.counts >= 0)
+        return pd.DataFrame(
+            {
+                "project": self.projects[rows],
+                "timestamp": self.months().tz_localize("UTC")[cols],
+                "edit_count": self.counts[rows, cols].astype(np.int64),
+            }
+        )
+
+    # --- Vectorized detection ---
+    def rolling_stats(self, threshold_percentage=DEFAULT_THRESHOLD):
+        """
+        3-year rolling statistics of every cell as float64 grids, NaN where
+        the cell is missing. Window sums come off integer prefix sums along
+        the month axis, so means equal `peak_detection` bit for bit.
+        """
+        present = self.counts >= 0
+        values = np.where(present, self.counts, 0).astype(np.int64)
+        width = values.shape[1]
+        sums = np.zeros((values.shape[0], width + 1), dtype=np.int64)
+        np.cumsum(values, axis=1, out=sums[:, 1:])
+        seen = np.zeros((values.shape[0], width + 1), dtype=np.int64)
+        np.cumsum(present, axis=1, out=seen[:, 1:])
+
+        hi = np.arange(1, width + 1)
+        lo = np.maximum(hi - 1 - WINDOW_MONTHS, 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rolling_mean = (sums[:, hi] - sums[:, lo]) / (seen[:, hi] - seen[:, lo])
+            rolling_mean[~present] = np.nan
+            pct_diff = (values - rolling_mean) / rolling_mean * 100
+            score = np.where(rolling_mean > 0, values / rolling_mean, np.nan)
+        return {
+            "rolling_mean": rolling_mean,
+            "threshold": rolling_mean * (1 + threshold_percentage),
+            "percentage_difference": pct_diff,
+            "score": score,
+        }
+
+    def peak_mask(self, threshold_percentage=DEFAULT_THRESHOLD):
+        stats = self.rolling_stats(threshold_percentage)
+        # The stored peak definition (peak_detection.is_peak); absent months
+        # have no score
+        return stats["score"] >= 1 + threshold_percentage
+
+    # --- Cross-project queries ---
+    def monthly_totals(self, mask=None):
+        """Total edits per month over the selected rows (all by default)."""
+        counts = self.counts if mask is None else self.counts[mask]
+        return pd.Series(
+            np.where(counts >= 0, counts, 0).sum(axis=0, dtype=np.int64),
+            index=self.months(),
+        )
+
+    def peak_counts(self, threshold_percentage=DEFAULT_THRESHOLD, mask=None):
+        """Number of projects peaking in each month, and of projects reporting."""
+        peaks = self.peak_mask(threshold_percentage)
+        present = self.counts >= 0
+        if mask is not None:
+            peaks, present = peaks[mask], present[mask]
+        return pd.DataFrame(
+            {"peaks": peaks.sum(axis=0), "projects": present.sum(axis=0)},
+            index=self.months(),
+        )
+
+    def stats_frame(self, threshold_percentage=DEFAULT_THRESHOLD):
+        """Present cells with their statistics, in the layout of the pandas engine."""
+        stats = self.rolling_stats(threshold_percentage)
+        rows, cols = np.nonzero(self.counts >= 0)
+        frame = self.to_frame()
+        for name, grid in stats.items():
+            frame[name] = grid[rows, cols]
+        return frame
+
+
+# --- Persistence driven by the database ---
+def update(df, path=MATRIX_DIR):
+    """
+    Write long-format rows into the stored matrix: in place through a
+    writable memory map when every cell already exists, otherwise by saving
+    a grown copy. Returns the matrix.
+    """
+    if not os.path.exists(os.path.join(path, COUNTS_FILE)):
+        matrix = EditMatrix.from_frame(df)
+        matrix.save(path)
+        return matrix
+    matrix = EditMatrix.load(path, mmap_mode="r+")
+    if df.empty:
+        return matrix
+    if matrix.covers(df):
+        matrix.set_cells(df)
+        matrix.counts.flush()
+        return matrix
+    matrix = matrix.grow(df)
+    matrix.set_cells(df)
+    matrix.save(path)
+    return matrix
+
+
+def refresh(projects=None, since=None, uri=None, path=MATRIX_DIR):
+    """
+    Reload edit_counts rows from the database into the matrix: all of them
+    the first time, afterwards only `projects` from month `since` on.
+    """
+    query = "SELECT project, timestamp, edit_count FROM edit_counts"
+    first_build = not os.path.exists(os.path.join(path, COUNTS_FILE))
+    if not first_build:
+        if not projects:
+            return EditMatrix.load(path)
+        names = ", ".join(f"'{escape_string(project)}'" for project in sorted(projects))
+        query += f" WHERE project IN ({names})"
+        if since is not None:
+            query += f" AND timestamp >= '{since:%Y-%m-%d}'"
+    df = to_pandas(load_arrow(query, uri, DEFAULT_PARTITIONS))
+    matrix = update(df, path)
+    logging.info(
+        f"Edit matrix {'built' if first_build else 'updated'} with {len(df)} rows: "
+        f"{matrix.counts.shape[0]} projects x {matrix.counts.shape[1]} months"
+    )
+    return matrix
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    parser = argparse.ArgumentParser(
+        description="Rebuild the project x month edit matrix from edit_counts."
+    )
+    parser.add_argument("--path", default=MATRIX_DIR)
+    args = parser.parse_args()
+    for name in (COUNTS_FILE, INDEX_FILE):
+        if os.path.exists(os.path.join(args.path, name)):
+            os.remove(os.path.join(args.path, name))
+    refresh(path=args.path)
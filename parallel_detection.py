@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+import logging
+import multiprocessing
+import os
+import tempfile
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from arrow_loader import normalize, to_pandas
+from peak_detection import (
+    DEFAULT_THRESHOLD,
+    rolling_3_year_stats_all_projects,
+    select_new_points,
+)
+
+# Chunks are spooled as Arrow IPC files here. Defaults to the temp dir rather
+# than /dev/shm, which is often tiny in job containers; the page cache keeps
+# the memory-mapped reads fast either way.
+SPOOL_DIR = os.getenv("DETECTION_SPOOL_DIR") or None
+CHUNKS_PER_WORKER = 4  # smaller chunks balance uneven projects and stream sooner
+
+
+# --- Arrow IPC spooling ---
+def write_ipc(table, path):
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def read_ipc(path):
+    """Memory-map an IPC file: columns point into the page cache, not copies."""
+    return pa.ipc.open_file(pa.memory_map(path)).read_all()
+
+
+# --- Partitioning ---
+def project_chunks(table, chunks):
+    """
+    Split `table` into at most `chunks` slices of about the same number of
+    rows, sorted by (project, timestamp). A project is never split.
+    """
+    table = table.set_column(
+        table.column_names.index("project"),
+        "project",
+        table.column("project").cast(pa.string()),
+    ).sort_by([("project", "ascending"), ("timestamp", "ascending")])
+    if table.num_rows == 0:
+        return []
+    run_ends = pc.run_end_encode(
+        table.column("project").combine_chunks()
+    ).run_ends.to_numpy()
+    targets = np.arange(1, chunks + 1) * table.num_rows / chunks
+    cuts = np.unique(run_ends[np.searchsorted(run_ends, targets, side="left")])
+    starts = np.concatenate([[0], cuts[:-1]])
+    return [table.slice(start, end - start) for start, end in zip(starts, cuts)]
+
+
+# --- Detectors run in the workers: Arrow chunk in, Arrow result out ---
+def pandas_stats(table, threshold_percentage=DEFAULT_THRESHOLD, incremental=False):
+    """Rolling statistics of a chunk's projects; only new points if incremental."""
+    df = to_pandas(normalize(table))
+    stats = rolling_3_year_stats_all_projects(df, threshold_percentage)
+    if incremental:
+        stats = select_new_points(stats, df)
+    return pa.Table.from_pandas(stats, preserve_index=False)
+
+
+def _run_chunk(job):
+    detect, in_path, out_path = job
+    result = detect(read_ipc(in_path))
+    write_ipc(result, out_path)
+    return out_path, result.num_rows
+
+
+# --- Driver ---
+def run_parallel(
+    table,
+    detect,
+    workers,
+    on_result,
+    chunks_per_worker=CHUNKS_PER_WORKER,
+    spool_dir=SPOOL_DIR,
+):
+    """
+    Run `detect` (a picklable function of an Arrow table returning an Arrow
+    table) over project chunks of `table` in a pool of `workers` processes.
+
+    Chunks reach the workers as Arrow IPC files that they memory-map, and
+    results come back the same way, so no DataFrame is pickled. Results are
+    handed to `on_result` in this process as each chunk finishes, which
+    keeps all database writes on one connection. Returns the number of
+    result rows.
+    """
+    chunks = project_chunks(table, max(1, workers * chunks_per_worker))
+    total = 0
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory(dir=spool_dir) as tmp:
+        jobs = []
+        for i, chunk in enumerate(chunks):
+            in_path = os.path.join(tmp, f"chunk-{i}.arrow")
+            write_ipc(chunk, in_path)
+            jobs.append((detect, in_path, os.path.join(tmp, f"result-{i}.arrow")))
+        del chunks
+
+        logging.info(f"Detecting {len(jobs)} project chunks with {workers} workers")
+        with context.Pool(workers) as pool:
+            for out_path, rows in pool.imap_unordered(_run_chunk, jobs):
+                on_result(read_ipc(out_path))
+                os.remove(out_path)
+                total += rows
+    return total
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import pandas as pd
+
+# --- Window definition shared by the nightly job and the web view ---
+ROLLING_WINDOW = pd.DateOffset(years=3)
+DEFAULT_THRESHOLD = 0.30
+
+
+# --- Window bounds ---
+def _window_bounds(timestamps, codes=None):
+    """
+    Return [lo, hi) row bounds of the [t - 3 years, t] window for every row.
+
+    `timestamps` must be sorted, or sorted within each group when `codes`
+    (sorted integer group ids) is given. Groups are searched in one go by
+    ranking timestamps against the distinct timestamps of the whole frame,
+    which gives every (group, timestamp) pair an exact integer sort key.
+    """
+    window_start = timestamps - ROLLING_WINDOW
+    if codes is None:
+        lo = timestamps.searchsorted(window_start, side="left")
+        hi = timestamps.searchsorted(timestamps, side="right")
+        return lo, hi
+
+    distinct = timestamps.unique().sort_values()
+    stride = np.int64(len(distinct) + 1)
+    codes = codes.astype(np.int64)
+    keys = codes * stride + distinct.searchsorted(timestamps, side="left")
+    start_keys = codes * stride + distinct.searchsorted(window_start, side="left")
+    lo = np.searchsorted(keys, start_keys, side="left")
+    hi = np.searchsorted(keys, keys, side="right")
+    return lo, hi
+
+
+def _window_stats(values, lo, hi, threshold_percentage):
+    # Integer prefix sums keep the window sums exact, so the means match the
+    # per-row `window.mean()` bit for bit.
+    acc_dtype = np.int64 if np.issubdtype(values.dtype, np.integer) else np.float64
+    prefix = np.zeros(len(values) + 1, dtype=acc_dtype)
+    np.cumsum(values, dtype=acc_dtype, out=prefix[1:])
+
+    rolling_mean = (prefix[hi] - prefix[lo]) / (hi - lo)
+    threshold = rolling_mean * (1 + threshold_percentage)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct_diff = ((values - rolling_mean) / rolling_mean) * 100
+        # Threshold-independent: a point is a peak at X% iff score >= 1 + X
+        score = np.where(rolling_mean > 0, values / rolling_mean, np.nan)
+    return rolling_mean, threshold, pct_diff, score
+
+
+# --- Rolling window statistics ---
+def rolling_3_year_stats(
+    df, threshold_percentage=DEFAULT_THRESHOLD, value_column="edit_count"
+):
+    """
+    Compute the 3-year rolling mean, threshold and percentage difference for
+    every row of a single project's series in one pass.
+
+    Each window is [t - DateOffset(years=3), t], exactly as in the original
+    per-row scan: window bounds are found with a binary search over the sorted
+    timestamps and window sums are read off a prefix sum.
+    """
+    df = df.sort_values("timestamp", kind="stable").reset_index(drop=True)
+    values = df[value_column].to_numpy()
+    lo, hi = _window_bounds(pd.DatetimeIndex(df["timestamp"]))
+    rolling_mean, threshold, pct_diff, score = _window_stats(
+        values, lo, hi, threshold_percentage
+    )
+
+    return pd.DataFrame(
+        {
+            "timestamp": df["timestamp"],
+            value_column: values,
+            "rolling_mean": rolling_mean,
+            "threshold": threshold,
+            "percentage_difference": pct_diff,
+            "score": score,
+        }
+    )
+
+
+def rolling_3_year_stats_all_projects(
+    df, threshold_percentage=DEFAULT_THRESHOLD, value_column="edit_count"
+):
+    """
+    Same as `rolling_3_year_stats`, for every project of a long-format frame
+    at once: one sort by (project, timestamp), one segmented window search and
+    one prefix sum over the whole table.
+    """
+    df = df.sort_values(["project", "timestamp"], kind="stable").reset_index(drop=True)
+    codes, _ = pd.factorize(df["project"], sort=True)
+    values = df[value_column].to_numpy()
+    lo, hi = _window_bounds(pd.DatetimeIndex(df["timestamp"]), codes)
+    rolling_mean, threshold, pct_diff, score = _window_stats(
+        values, lo, hi, threshold_percentage
+    )
+
+    return pd.DataFrame(
+        {
+            "project": df["project"],
+            "timestamp": df["timestamp"],
+            value_column: values,
+            "rolling_mean": rolling_mean,
+            "threshold": threshold,
+            "percentage_difference": pct_diff,
+            "score": score,
+        }
+    )
+
+
+# --- Granularity ---
+def rollup_to_monthly(df, value_column="edit_count"):
+    """
+    Monthly totals of daily rows per project, stamped at the month start like
+    edit_counts (the same roll-up as the edit_counts_daily_monthly view).
+    """
+    timestamps = df["timestamp"]
+    tz = timestamps.dt.tz
+    months = timestamps.dt.tz_localize(None) if tz is not None else timestamps
+    months = months.dt.to_period("M").dt.to_timestamp()
+    if tz is not None:
+        months = months.dt.tz_localize(tz)
+    return (
+        df.assign(timestamp=months)
+        .groupby(["project", "timestamp"], observed=True, sort=True)[value_column]
+        .sum()
+        .reset_index()
+    )
+
+
+# --- Stored peaks ---
+def is_peak(stats, threshold_percentage=DEFAULT_THRESHOLD):
+    """
+    The peaks that community_alerts stores, /api/peaks serves and the email
+    digest sends: points whose score is at least 1 + threshold. Unlike
+    `edit_count >= threshold`, a window of zeros has no score and no peak.
+    """
+    return stats["score"] >= 1 + threshold_percentage
+
+
+# --- Incremental runs ---
+def select_new_points(stats, source):
+    """Keep only the rows of `stats` after each project's `last_timestamp` in `source`."""
+    watermarks = (
+        source.dropna(subset=["last_timestamp"])
+        .groupby("project")["last_timestamp"]
+        .first()
+    )
+    last = stats["project"].map(watermarks)
+    return stats[last.isna() | (stats["timestamp"] > last)]
+
+
+# --- Peak detection ---
+def find_peaks_rolling_3_years(
+    df, threshold_percentage=DEFAULT_THRESHOLD, value_column="edit_count"
+):
+    stats = rolling_3_year_stats(df, threshold_percentage, value_column)
+    stats = stats[stats[value_column] >= stats["threshold"]]
+    return stats.to_dict("records")
+
+
+def find_peaks_all_projects(
+    df, threshold_percentage=DEFAULT_THRESHOLD, value_column="edit_count"
+):
+    """
+    Batched detection over every project: returns one peaks table with the
+    columns of the `community_alerts` table.
+    """
+    stats = rolling_3_year_stats_all_projects(df, threshold_percentage, value_column)
+    return stats[stats[value_column] >= stats["threshold"]].reset_index(drop=True)
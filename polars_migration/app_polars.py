@@ -67,7 +67,7 @@ def find_peaks_rolling_3_years_polars_optimized(df, threshold_percentage=0.30):
     df_with_rolling = df.with_columns(
         [
             pl.col("edits")
-            .rolling_mean_by("timestamp", window_size="3y")
+            .rolling_mean_by("timestamp", window_size="3y", closed="both")
             .alias("rolling_mean")
         ]
     )
@@ -125,7 +125,12 @@ def find_peaks_rolling_3_years_polars_exact(df, threshold_percentage=0.30):
         edit_counts = [r["edits"] for r in window_data]
         rolling_mean = sum(edit_counts) / len(edit_counts)
         threshold = rolling_mean * (1 + threshold_percentage)
-        pct_diff = ((edits_i - rolling_mean) / rolling_mean) * 100
+        # An all-zero window has no percentage difference (NaN, as in pandas)
+        pct_diff = (
+            ((edits_i - rolling_mean) / rolling_mean) * 100
+            if rolling_mean
+            else float("nan")
+        )
 
         if edits_i >= threshold:
             peaks_list.append(
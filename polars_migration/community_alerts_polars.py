@@ -1,25 +1,43 @@
 #!/usr/bin/env python3
 
+import argparse
 import polars as pl
 import pymysql
 import configparser
 import logging
+import math
+import os
 from datetime import timedelta
+from functools import partial
+
+from pymysql.converters import escape_string
+
+from arrow_loader import load_arrow, mysql_uri, to_polars
+from db import bulk_upsert
+from parallel_detection import run_parallel
+import snapshot
 
 # --- Setup logging ---
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
 
-#--- DB config ---
-cfg = configparser.ConfigParser()
-cfg.read("/data/project/community-activity-alerts-system/replica.my.cnf")
-user = cfg["client"]["user"]
-password = cfg["client"]["password"]
-
 DB_NAME = "s56391__community_alerts"
 SOURCE_TABLE = "edit_counts"
 ALERTS_TABLE = "community_alerts"
+ALERT_COLUMNS = [
+    "project",
+    "timestamp",
+    "edit_count",
+    "rolling_mean",
+    "threshold",
+    "percentage_difference",
+]
+
+# Streaming mode: Parquet bytes (snapshot) or projects (database) per chunk.
+# Peak memory follows the chunk size, not the size of edit_counts.
+STREAM_CHUNK_BYTES = 16 * 2**20  # about 50 MiB of rows once decoded
+STREAM_CHUNK_PROJECTS = 200
 
 # Uncomment for local testing:
 # DB_USER = "wikim"
@@ -61,7 +79,12 @@ def find_peaks_rolling_3_years_polars(df, threshold_percentage=0.30):
         edit_counts = [r["edit_count"] for r in window_data]
         rolling_mean = sum(edit_counts) / len(edit_counts)
         threshold = rolling_mean * (1 + threshold_percentage)
-        pct_diff = ((edits_i - rolling_mean) / rolling_mean) * 100
+        # An all-zero window has no percentage difference (NaN, as in pandas)
+        pct_diff = (
+            ((edits_i - rolling_mean) / rolling_mean) * 100
+            if rolling_mean
+            else float("nan")
+        )
 
         if edits_i >= threshold:
             peaks_list.append(
@@ -88,7 +111,7 @@ def find_peaks_rolling_3_years_polars_optimized(df, threshold_percentage=0.30):
     df_with_rolling = df.with_columns(
         [
             pl.col("edit_count")
-            .rolling_mean_by("timestamp", window_size="3y")
+            .rolling_mean_by("timestamp", window_size="3y", closed="both")
             .alias("rolling_mean")
         ]
     )
@@ -114,7 +137,135 @@ def find_peaks_rolling_3_years_polars_optimized(df, threshold_percentage=0.30):
     return peaks_df.to_dicts() if not peaks_df.is_empty() else []
 
 
-def main():
+def find_peaks_chunk(table, threshold_percentage=0.30):
+    """
+    Peaks of every project of an Arrow chunk, as an Arrow table with the
+    alert columns. Runs in the worker processes of `main(workers=N)`.
+    """
+    peaks = []
+    for _, group_df in to_polars(table).group_by("project", maintain_order=True):
+        peaks.extend(
+            find_peaks_rolling_3_years_polars_optimized(group_df, threshold_percentage)
+        )
+    schema = {
+        "project": pl.String,
+        "timestamp": pl.Datetime("us", "UTC"),
+        "edit_count": pl.Int64,
+        "rolling_mean": pl.Float64,
+        "threshold": pl.Float64,
+        "percentage_difference": pl.Float64,
+    }
+    return pl.DataFrame(
+        [{name: peak[name] for name in ALERT_COLUMNS} for peak in peaks],
+        schema=schema,
+    ).to_arrow()
+
+
+# --- Streaming (out-of-core) pipeline ---
+def lazy_peaks(lf, threshold_percentage=0.30):
+    """
+    `find_peaks_rolling_3_years_polars_optimized` as a lazy query over any
+    number of projects: the same "3y" rolling mean, per project.
+    """
+    return (
+        lf.select(["project", "timestamp", "edit_count"])
+        .sort(["project", "timestamp"])
+        .with_columns(
+            pl.col("edit_count")
+            .rolling_mean_by("timestamp", window_size="3y", closed="both")
+            .over("project")
+            .alias("rolling_mean")
+        )
+        .with_columns(
+            (pl.col("rolling_mean") * (1 + threshold_percentage)).alias("threshold"),
+            (
+                (pl.col("edit_count") - pl.col("rolling_mean"))
+                / pl.col("rolling_mean")
+                * 100
+            ).alias("percentage_difference"),
+        )
+        .filter(
+            (pl.col("edit_count") >= pl.col("threshold"))
+            & (pl.col("rolling_mean").is_not_null())
+        )
+    )
+
+
+def snapshot_chunks(chunk_bytes=STREAM_CHUNK_BYTES, snapshot_dir=snapshot.SNAPSHOT_DIR):
+    """Lazy scans of the edit_counts snapshot, a group of whole projects each."""
+    batch, size = [], 0
+    for path in snapshot.partition_paths(SOURCE_TABLE, snapshot_dir):
+        batch.append(path)
+        size += os.path.getsize(path)
+        if size >= chunk_bytes:
+            yield pl.scan_parquet(batch, hive_partitioning=False)
+            batch, size = [], 0
+    if batch:
+        yield pl.scan_parquet(batch, hive_partitioning=False)
+
+
+def database_chunks(conn, uri, chunk_projects=STREAM_CHUNK_PROJECTS):
+    """The same chunks read from the database, one project IN-list per query."""
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT DISTINCT project FROM {SOURCE_TABLE} ORDER BY project")
+        projects = [row[0] for row in cursor.fetchall()]
+    for i in range(0, len(projects), chunk_projects):
+        names = ", ".join(
+            f"'{escape_string(project)}'"
+            for project in projects[i : i + chunk_projects]
+        )
+        query = (
+            f"SELECT project, timestamp, edit_count FROM {SOURCE_TABLE} "
+            f"WHERE project IN ({names})"
+        )
+        yield to_polars(load_arrow(query, uri, partitions=1)).lazy()
+
+
+def stream_peaks(chunks, on_peaks, threshold_percentage=0.30):
+    """
+    Run `lazy_peaks` on each lazy chunk with the streaming engine and hand
+    the peaks to `on_peaks` before the next chunk is read. Returns the
+    number of peaks.
+    """
+    total = 0
+    for lf in chunks:
+        peaks = lazy_peaks(lf, threshold_percentage).collect(engine="streaming")
+        if not peaks.is_empty():
+            on_peaks(peaks)
+        total += peaks.height
+    return total
+
+
+def nullable_float(value):
+    # An all-zero window has no percentage difference; store NULL, not NaN,
+    # which pymysql cannot send
+    return float(value) if value is not None and math.isfinite(value) else None
+
+
+def write_peaks(conn, table):
+    """Bulk upsert an Arrow table of peaks (one chunk of a parallel run)."""
+    rows = [
+        (
+            row["project"],
+            row["timestamp"].replace(tzinfo=None),
+            int(row["edit_count"]),
+            nullable_float(row["rolling_mean"]),
+            nullable_float(row["threshold"]),
+            nullable_float(row["percentage_difference"]),
+        )
+        for row in table.to_pylist()
+    ]
+    written = bulk_upsert(conn, ALERTS_TABLE, ALERT_COLUMNS, rows, ALERT_COLUMNS[2:])
+    logging.info(f"Upserted {written} of {len(rows)} peaks into {ALERTS_TABLE}")
+
+
+def main(workers=1, streaming=False):
+    # --- DB config (read here so the detectors can be imported anywhere) ---
+    cfg = configparser.ConfigParser()
+    cfg.read("/data/project/community-activity-alerts-system/replica.my.cnf")
+    user = cfg["client"]["user"]
+    password = cfg["client"]["password"]
+
     conn = None
     try:
         # Connect to DB
@@ -151,24 +302,39 @@ def main():
             )
             """)
 
-        # Read data using traditional method (more reliable than read_database_uri)
-        query = f"SELECT project, timestamp, edit_count FROM {SOURCE_TABLE}"
+        # Chunk by chunk from the snapshot (or the database without one);
+        # only one chunk and its peaks are in memory at a time
+        if streaming:
+            if snapshot.exists(SOURCE_TABLE):
+                chunks = snapshot_chunks()
+            else:
+                chunks = database_chunks(conn, mysql_uri(user, password))
+            found = stream_peaks(
+                chunks, lambda peaks: write_peaks(conn, peaks.to_arrow()), 0.30
+            )
+            logging.info(f"Streamed detection found {found} peaks")
+            return
 
-        with conn.cursor() as cursor:
-            cursor.execute(query)
-            results = cursor.fetchall()
+        # Read data straight into Arrow (UTC timestamps, no per-row tuples)
+        query = f"SELECT project, timestamp, edit_count FROM {SOURCE_TABLE}"
+        table = load_arrow(query, mysql_uri(user, password))
 
-        if not results:
+        if table.num_rows == 0:
             logging.info("Source table is empty. Nothing to process.")
             return
 
-        # Convert to Polars DataFrame
-        df = pl.DataFrame(
-            results, schema=["project", "timestamp", "edit_count"], orient="row"
-        )
+        # Project chunks run in worker processes; peaks come back per chunk
+        # and are written here, on the one connection
+        if workers > 1:
+            run_parallel(
+                table,
+                partial(find_peaks_chunk, threshold_percentage=0.30),
+                workers,
+                lambda peaks: write_peaks(conn, peaks),
+            )
+            return
 
-        # Ensure timestamp is datetime and timezone-aware
-        df = df.with_columns(pl.col("timestamp").dt.replace_time_zone("UTC"))
+        df = to_polars(table)
 
         # Process each project
         for project_name, group_df in df.group_by("project", maintain_order=True):
@@ -205,9 +371,9 @@ def main():
                                 project_name,
                                 peak["timestamp"],
                                 int(peak["edit_count"]),
-                                float(peak["rolling_mean"]),
-                                float(peak["threshold"]),
-                                float(peak["percentage_difference"]),
+                                nullable_float(peak["rolling_mean"]),
+                                nullable_float(peak["threshold"]),
+                                nullable_float(peak["percentage_difference"]),
                             ),
                         )
                     except Exception as e:
@@ -226,4 +392,20 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(
+        description="Detect edit activity peaks with Polars."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Processes to split the projects across (1 runs them serially).",
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Detect chunk by chunk from the Parquet snapshot (or the database) "
+        "with bounded memory instead of loading all of edit_counts.",
+    )
+    args = parser.parse_args()
+    main(workers=args.workers, streaming=args.streaming)
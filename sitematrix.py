@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+
+import json
+import logging
+import os
+import threading
+import time
+
+import requests
+
+SITEMATRIX_URL = "https://meta.wikimedia.org/w/api.php?action=sitematrix&format=json"
+SNAPSHOT_PATH = os.getenv(
+    "SITEMATRIX_SNAPSHOT",
+    "/data/project/community-activity-alerts-system/sitematrix.json",
+)
+CACHE_TTL = 6 * 60 * 60  # seconds before the payload is revalidated
+
+HEADERS = {
+    "User-Agent": "Community Activity Alerts (https://github.com/indictechcom/community-activity-alerts)",
+    "tool": "Community Activity Alerts",
+    "url": "https://github.com/indictechcom/community-activity-alerts",
+    "email": "tools.community-activity-alerts-system@toolforge.org",
+}
+
+
+# --- Views derived from the payload ---
+def parse_languages(data):
+    """Language name -> [{"sitename", "url"}], as shown in the web app."""
+    languages = {}
+    for key, value in data["sitematrix"].items():
+        if key.isdigit() and "localname" in value:
+            communities = [
+                {"sitename": site["code"], "url": site["url"]}
+                for site in value.get("site", [])
+            ]
+            languages[value["localname"]] = communities
+    return languages
+
+
+def parse_open_projects(data):
+    """Host names of every open language site, as fetched by the cron."""
+    projects = set()
+    for key, val in data.get("sitematrix", {}).items():
+        if key in ("count", "specials"):
+            continue
+        if isinstance(val, dict):
+            for site in val.get("site", []):
+                if site.get("closed"):
+                    continue
+                site_url = site.get("url")
+                if site_url:
+                    projects.add(site_url.replace("https://", ""))
+    return projects
+
+
+# --- Cache ---
+class SiteMatrixCache:
+    """
+    SiteMatrix payload cached in process for `ttl` seconds and snapshotted to
+    disk for cold starts. Stale payloads are revalidated with the ETag and
+    Last-Modified validators of the previous response, and served as-is if
+    the API cannot be reached. Both parsed views are derived once per payload.
+    """
+
+    def __init__(self, url=SITEMATRIX_URL, snapshot_path=SNAPSHOT_PATH, ttl=CACHE_TTL):
+        self.url = url
+        self.snapshot_path = snapshot_path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.text = None
+        self.validators = {}
+        self.fetched_at = 0.0
+        self.views = {}
+
+    def _load_snapshot(self):
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+            self._set(snapshot["text"], snapshot["validators"], snapshot["fetched_at"])
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Ignoring unreadable SiteMatrix snapshot: {e}")
+
+    def _save_snapshot(self):
+        if not self.snapshot_path:
+            return
+        tmp_path = f"{self.snapshot_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "text": self.text,
+                        "validators": self.validators,
+                        "fetched_at": self.fetched_at,
+                    },
+                    f,
+                )
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            logging.warning(f"Could not write SiteMatrix snapshot: {e}")
+
+    def _set(self, text, validators, fetched_at):
+        data = json.loads(text)
+        self.views = {
+            "text": text,
+            "data": data,
+            "languages": parse_languages(data),
+            "open_projects": parse_open_projects(data),
+        }
+        self.text = text
+        self.validators = validators
+        self.fetched_at = fetched_at
+
+    def _revalidate(self):
+        headers = dict(HEADERS)
+        if "etag" in self.validators:
+            headers["If-None-Match"] = self.validators["etag"]
+        if "last_modified" in self.validators:
+            headers["If-Modified-Since"] = self.validators["last_modified"]
+
+        try:
+            response = requests.get(self.url, headers=headers, timeout=30)
+            if response.status_code == 304 and self.text is not None:
+                self.fetched_at = time.time()
+            else:
+                response.raise_for_status()
+                validators = {}
+                if "ETag" in response.headers:
+                    validators["etag"] = response.headers["ETag"]
+                if "Last-Modified" in response.headers:
+                    validators["last_modified"] = response.headers["Last-Modified"]
+                self._set(response.text, validators, time.time())
+        except (requests.RequestException, ValueError) as e:
+            if self.text is None:
+                raise
+            logging.warning(f"SiteMatrix refresh failed, serving cached copy: {e}")
+            return
+        self._save_snapshot()
+
+    def _get(self, view):
+        with self.lock:
+            if self.text is None:
+                self._load_snapshot()
+            if self.text is None or time.time() - self.fetched_at > self.ttl:
+                self._revalidate()
+            return self.views[view]
+
+    def data(self):
+        return self._get("data")
+
+    def raw(self):
+        return self._get("text")
+
+    def languages(self):
+        return self._get("languages")
+
+    def open_projects(self):
+        return self._get("open_projects")
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+import argparse
+import logging
+import os
+from urllib.parse import quote
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from pymysql.converters import escape_string
+
+from arrow_loader import DEFAULT_PARTITIONS, load_arrow
+
+SNAPSHOT_DIR = os.getenv(
+    "EDIT_SNAPSHOT_DIR", "/data/project/community-activity-alerts-system/snapshot"
+)
+SNAPSHOT_TABLES = ("edit_counts", "edit_stats", "community_alerts", "edit_metrics")
+DAILY_TABLES = ("edit_counts_daily", "edit_stats_daily", "community_alerts_daily")
+REFRESH_CHUNK = 500  # projects per refresh query
+
+
+# --- Layout: <dir>/<table>/project=<name>/data.parquet ---
+def table_dir(table, snapshot_dir=SNAPSHOT_DIR):
+    return os.path.join(snapshot_dir, table)
+
+
+def partition_path(table, project, snapshot_dir=SNAPSHOT_DIR):
+    return os.path.join(
+        table_dir(table, snapshot_dir),
+        f"project={quote(project, safe='')}",
+        "data.parquet",
+    )
+
+
+def parquet_glob(table, snapshot_dir=SNAPSHOT_DIR):
+    """Glob matching every partition of a table, for engines that scan Parquet."""
+    return os.path.join(table_dir(table, snapshot_dir), "*", "data.parquet")
+
+
+def exists(table, snapshot_dir=SNAPSHOT_DIR):
+    return os.path.isdir(table_dir(table, snapshot_dir))
+
+
+def partition_paths(table, snapshot_dir=SNAPSHOT_DIR):
+    root = table_dir(table, snapshot_dir)
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        os.path.join(root, name, "data.parquet")
+        for name in os.listdir(root)
+        if os.path.exists(os.path.join(root, name, "data.parquet"))
+    )
+
+
+# --- Reads (memory-mapped) ---
+def read_project(table, project, columns=None, snapshot_dir=SNAPSHOT_DIR):
+    """One project's rows, or None if the snapshot has no partition for it."""
+    path = partition_path(table, project, snapshot_dir)
+    if not os.path.exists(path):
+        return None
+    return pq.ParquetFile(path, memory_map=True).read(columns=columns)
+
+
+def read_table(table, columns=None, snapshot_dir=SNAPSHOT_DIR):
+    """Every partition of a table as one Arrow table, read through mmap."""
+    paths = partition_paths(table, snapshot_dir)
+    if not paths:
+        raise FileNotFoundError(f"No snapshot of {table} in {snapshot_dir}")
+    return pa.concat_tables(
+        pq.ParquetFile(path, memory_map=True).read(columns=columns) for path in paths
+    )
+
+
+# --- Writes ---
+def write_partition(table, project, rows, snapshot_dir=SNAPSHOT_DIR):
+    """Atomically replace one project's partition; no rows removes it."""
+    path = partition_path(table, project, snapshot_dir)
+    if rows.num_rows == 0:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    pq.write_table(rows, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def split_by_project(rows):
+    """Yield (project, rows sorted by timestamp) for every project in `rows`."""
+    rows = rows.set_column(
+        rows.column_names.index("project"),
+        "project",
+        rows.column("project").cast(pa.string()),
+    ).sort_by([("project", "ascending"), ("timestamp", "ascending")])
+    runs = pc.run_end_encode(rows.column("project").combine_chunks())
+    start = 0
+    for project, end in zip(runs.values.to_pylist(), runs.run_ends.to_pylist()):
+        yield project, rows.slice(start, end - start)
+        start = end
+
+
+def refresh(
+    table,
+    projects=None,
+    uri=None,
+    partitions=DEFAULT_PARTITIONS,
+    snapshot_dir=SNAPSHOT_DIR,
+):
+    """
+    Re-export `projects` (all of them when None) of a database table into the
+    snapshot. Each project's partition is rewritten whole, so upserts of old
+    months and deleted rows are picked up too. Returns the rows written.
+    """
+    written = 0
+    if projects is None:
+        chunks = [None]
+    else:
+        projects = sorted(projects)
+        chunks = [
+            projects[i : i + REFRESH_CHUNK]
+            for i in range(0, len(projects), REFRESH_CHUNK)
+        ]
+
+    for chunk in chunks:
+        query = f"SELECT * FROM {table}"
+        if chunk is not None:
+            names = ", ".join(f"'{escape_string(project)}'" for project in chunk)
+            query += f" WHERE project IN ({names})"
+        rows = load_arrow(query, uri, partitions)
+
+        found = set()
+        for project, project_rows in split_by_project(rows):
+            write_partition(table, project, project_rows, snapshot_dir)
+            found.add(project)
+            written += project_rows.num_rows
+        for project in set(chunk or ()) - found:
+            write_partition(table, project, rows.schema.empty_table(), snapshot_dir)
+
+    logging.info(
+        f"Snapshot of {table}: {written} rows for "
+        f"{'all' if projects is None else len(projects)} projects refreshed"
+    )
+    return written
+
+
+def refresh_changed(
+    table,
+    projects,
+    uri=None,
+    partitions=DEFAULT_PARTITIONS,
+    snapshot_dir=SNAPSHOT_DIR,
+):
+    """Incremental refresh after a write; the first call exports everything."""
+    if not exists(table, snapshot_dir):
+        return refresh(table, None, uri, partitions, snapshot_dir)
+    if not projects:
+        return 0
+    return refresh(table, projects, uri, partitions, snapshot_dir)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    parser = argparse.ArgumentParser(
+        description="Rebuild the local Parquet snapshot of the database tables."
+    )
+    parser.add_argument(
+        "tables",
+        nargs="*",
+        choices=SNAPSHOT_TABLES + DAILY_TABLES,
+        default=list(SNAPSHOT_TABLES),
+    )
+    parser.add_argument("--snapshot-dir", default=SNAPSHOT_DIR)
+    parser.add_argument("--partitions", type=int, default=DEFAULT_PARTITIONS)
+    args = parser.parse_args()
+    for table in args.tables:
+        refresh(table, None, partitions=args.partitions, snapshot_dir=args.snapshot_dir)
@@ -0,0 +1,96 @@
+"""
+Peak writes of the Polars detector, on a connection that escapes every value
+the way pymysql does.
+
+    python -m pytest tests
+"""
+
+import pandas as pd
+import polars as pl
+import pyarrow as pa
+from pymysql.converters import escape_item
+
+from polars_migration.community_alerts_polars import (
+    find_peaks_chunk,
+    lazy_peaks,
+    stream_peaks,
+    write_peaks,
+)
+
+
+class EscapingCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def executemany(self, sql, rows):
+        # pymysql escapes every parameter before sending; NaN raises here
+        for row in rows:
+            self.conn.pending.append(
+                tuple(escape_item(value, "utf8mb4") for value in row)
+            )
+
+
+class EscapingConnection:
+    def __init__(self):
+        self.pending = []
+        self.rows = []
+
+    def cursor(self):
+        return EscapingCursor(self)
+
+    def begin(self):
+        self.pending = []
+
+    def commit(self):
+        self.rows.extend(self.pending)
+
+    def rollback(self):
+        self.pending = []
+
+
+def zero_window_chunk():
+    """One project that never edits, one with a spike."""
+    timestamps = pd.date_range("2020-01-01", periods=12, freq="MS", tz="UTC")
+    return pa.Table.from_pandas(
+        pd.DataFrame(
+            {
+                "project": ["zero.example.org"] * 12 + ["spike.example.org"] * 12,
+                "timestamp": list(timestamps) * 2,
+                "edit_count": [0] * 12 + [10] * 11 + [100],
+            }
+        ),
+        preserve_index=False,
+    )
+
+
+def test_parallel_chunk_with_zero_window_is_written():
+    peaks = find_peaks_chunk(zero_window_chunk())
+    # 0 >= 0 * 1.3: every month of the silent project is a peak, as in pandas
+    assert peaks.num_rows == 13
+    conn = EscapingConnection()
+    write_peaks(conn, peaks)
+    assert len(conn.rows) == 13
+    zero_rows = [row for row in conn.rows if "zero" in row[0]]
+    # percentage_difference is NULL, not NaN
+    assert all(row[5] == "NULL" for row in zero_rows)
+
+
+def test_streamed_chunk_with_zero_window_is_written():
+    conn = EscapingConnection()
+    chunk = pl.from_arrow(zero_window_chunk()).lazy()
+    found = stream_peaks([chunk], lambda peaks: write_peaks(conn, peaks.to_arrow()))
+    assert found == 13
+    assert len(conn.rows) == 13
+
+
+def test_lazy_peaks_keeps_zero_windows():
+    peaks = lazy_peaks(pl.from_arrow(zero_window_chunk()).lazy()).collect()
+    zero = peaks.filter(pl.col("project") == "zero.example.org")
+    assert zero.height == 12
+    assert zero["percentage_difference"].is_nan().all()
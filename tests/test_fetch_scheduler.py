@@ -0,0 +1,190 @@
+"""
+Fetch tiers of fetch_scheduler.py.
+
+    python -m pytest tests
+"""
+
+import zlib
+from datetime import date, datetime
+
+import pytest
+
+import fetch_scheduler
+from edit_fetcher import FetchTask
+from fetch_scheduler import (
+    ACTIVE_MIN,
+    BUSY_MIN,
+    TIERS,
+    WINDOW_MONTHS,
+    assign_tier,
+    refresh_tiers,
+    schedule,
+)
+from ingest_planner import add_months, month_end
+
+
+class ActivityCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.result = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        # Activity queries are answered from the table they read
+        words = sql.split()
+        if words[0] == "SELECT":
+            table = words[words.index("FROM") + 1]
+            self.conn.queried.append(table)
+            self.result = self.conn.activity.get(table, [])
+
+    def executemany(self, sql, rows):
+        self.conn.stored.extend(rows)
+
+    def fetchall(self):
+        return self.result
+
+
+class ActivityConnection:
+    """Stands in for pymysql: monthly activity rows per source table."""
+
+    def __init__(self, activity):
+        self.activity = activity
+        self.queried = []
+        self.stored = []
+
+    def cursor(self):
+        return ActivityCursor(self)
+
+    def begin(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def fetched_state(last_month):
+    return {"first_month": date(2020, 1, 1), "last_month": last_month}
+
+
+# --- Daily-only projects ---
+def test_daily_runs_tier_by_the_daily_rollup():
+    projects = ["busy.example.org", "quiet.example.org"]
+    states = {project: fetched_state(date(2024, 5, 1)) for project in projects}
+    # Daily-only projects: nothing in edit_counts, months in the roll-up
+    rollup = "edit_counts_daily_monthly"  # fetch_and_store_cron.ACTIVITY_TABLES
+    conn = ActivityConnection(
+        {
+            rollup: [
+                ("busy.example.org", 50_000, datetime(2024, 5, 1)),
+                ("quiet.example.org", 12, datetime(2024, 2, 1)),
+            ]
+        }
+    )
+    tiers, activity = refresh_tiers(
+        conn, projects, date(2024, 5, 1), states, source_table=rollup
+    )
+    assert conn.queried == [rollup]
+    assert tiers == {"busy.example.org": "busy", "quiet.example.org": "quiet"}
+    assert activity["busy.example.org"] == (50_000, datetime(2024, 5, 1))
+    assert {row[:2] for row in conn.stored} == set(tiers.items())
+
+
+def test_monthly_source_misses_daily_only_projects():
+    # What daily runs got when activity was always read from edit_counts
+    states = {"busy.example.org": fetched_state(date(2024, 5, 1))}
+    conn = ActivityConnection({})
+    tiers, _ = refresh_tiers(conn, list(states), date(2024, 5, 1), states)
+    assert conn.queried == [fetch_scheduler.SOURCE_TABLE]
+    assert tiers == {"busy.example.org": "dormant"}
+
+
+# --- Tiers ---
+FETCHED = {"first_month": date(2020, 1, 1), "last_month": date(2024, 5, 1)}
+NEVER_FETCHED = {"first_month": None, "last_month": None}
+
+
+@pytest.mark.parametrize(
+    "activity, state, tier",
+    [
+        (None, None, "new"),
+        (None, NEVER_FETCHED, "new"),
+        (None, FETCHED, "dormant"),  # fetched, but no edits in the window
+        ((0, None), FETCHED, "dormant"),
+        ((1, datetime(2024, 1, 1)), FETCHED, "quiet"),
+        ((ACTIVE_MIN * WINDOW_MONTHS - 1, None), FETCHED, "quiet"),
+        ((ACTIVE_MIN * WINDOW_MONTHS, None), FETCHED, "active"),
+        ((BUSY_MIN * WINDOW_MONTHS - 1, None), FETCHED, "active"),
+        ((BUSY_MIN * WINDOW_MONTHS, None), FETCHED, "busy"),
+        ((BUSY_MIN * WINDOW_MONTHS, None), None, "busy"),
+    ],
+)
+def test_assign_tier(activity, state, tier):
+    assert assign_tier(activity, state) == tier
+
+
+# --- Due rule ---
+def task(project, first, last):
+    return FetchTask(
+        project, first.strftime("%Y%m%d"), month_end(last).strftime("%Y%m%d")
+    )
+
+
+def due_months(tier, missing_months, months=24):
+    """The runs of `months` consecutive months in which a project is due."""
+    project = f"{tier}.example.org"
+    due = []
+    for i in range(months):
+        desired_last = add_months(date(2024, 1, 1), i)
+        first = add_months(desired_last, 1 - missing_months)
+        tasks, deferred = schedule(
+            [task(project, first, desired_last)], {project: tier}, {}, desired_last
+        )
+        assert len(tasks) + len(deferred) == 1
+        if tasks:
+            due.append(desired_last)
+    return due
+
+
+@pytest.mark.parametrize("tier", list(TIERS))
+def test_due_once_per_interval_in_the_project_phase(tier):
+    interval = TIERS[tier].interval
+    due = due_months(tier, missing_months=1)
+    assert len(due) == 24 // interval
+    phase = zlib.crc32(f"{tier}.example.org".encode()) % interval
+    assert all((d.year * 12 + d.month - 1) % interval == phase for d in due)
+
+
+@pytest.mark.parametrize(
+    "tier, missing_months, always_due",
+    [
+        ("quiet", 2, False),
+        ("quiet", 3, True),  # oldest missing month a full interval old
+        ("quiet", 5, True),
+        ("dormant", 5, False),
+        ("dormant", 6, True),
+        ("busy", 1, True),
+    ],
+)
+def test_due_once_oldest_missing_month_is_an_interval_old(
+    tier, missing_months, always_due
+):
+    due = due_months(tier, missing_months)
+    assert (len(due) == 24) == always_due
+
+
+def test_due_tasks_are_ordered_busiest_first():
+    last = date(2024, 6, 1)
+    tiers = {"a.org": "active", "b.org": "busy", "c.org": "busy", "n.org": "new"}
+    activity = {"a.org": (500, None), "b.org": (20_000, None), "c.org": (90_000, None)}
+    tasks = [task(project, last, last) for project in sorted(tiers)]
+    due, deferred = schedule(tasks, tiers, activity, last)
+    assert [t.project for t in due] == ["c.org", "b.org", "a.org", "n.org"]
+    assert deferred == []
@@ -0,0 +1,132 @@
+"""
+Gap planning of ingest_planner.py.
+
+    python -m pytest tests
+"""
+
+from datetime import date
+
+import pytest
+
+from ingest_planner import (
+    completed_state,
+    load_stored_months,
+    plan_missing_ranges,
+    plan_tasks,
+)
+
+
+def m(month):
+    """Month start of 2024 (month numbers above 12 run into 2025)."""
+    return date(2024 + (month - 1) // 12, (month - 1) % 12 + 1, 1)
+
+
+def state(first, last):
+    return {"first_month": m(first), "last_month": m(last), "status": "done"}
+
+
+class MonthsCursor:
+    """Answers the stored-months query with (project, first day, days) rows."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchall(self):
+        return self.rows
+
+
+class MonthsConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self):
+        return MonthsCursor(self.rows)
+
+
+# --- Stored months ---
+def test_partially_stored_daily_month_is_planned_again():
+    # A daily batch failed after the first 10 days of February were written;
+    # the failed state kept its old interval, which ends in January
+    conn = MonthsConnection(
+        [
+            ("en.example.org", date(2024, 1, 1), 31),
+            ("en.example.org", date(2024, 2, 1), 10),
+        ]
+    )
+    stored = load_stored_months(conn, "edit_counts_daily", date(2024, 1, 1), daily=True)
+    assert stored == {"en.example.org": {date(2024, 1, 1)}}
+
+    states = {
+        "en.example.org": {
+            "first_month": date(2023, 1, 1),
+            "last_month": date(2024, 1, 1),
+            "status": "failed",
+        }
+    }
+    tasks = plan_tasks(
+        ["en.example.org"], date(2024, 1, 1), date(2024, 2, 1), stored, states
+    )
+    assert [(task.start, task.end) for task in tasks] == [("20240201", "20240229")]
+
+
+def test_monthly_rows_count_whole_months():
+    conn = MonthsConnection([("en.example.org", date(2024, 2, 1), 1)])
+    stored = load_stored_months(conn, "edit_counts", date(2024, 1, 1))
+    assert stored == {"en.example.org": {date(2024, 2, 1)}}
+
+
+# --- Missing ranges ---
+@pytest.mark.parametrize(
+    "stored, covered, ranges",
+    [
+        ([], None, [(1, 6)]),
+        ([1, 2, 3, 4, 5, 6], None, []),
+        ([2, 4], None, [(1, 1), (3, 3), (5, 6)]),  # gaps between stored months
+        ([], (1, 3), [(4, 6)]),  # months the state records as fetched
+        ([], (3, 4), [(1, 2), (5, 6)]),
+        ([6], (1, 3), [(4, 5)]),
+        ([], (7, 9), [(1, 6)]),  # an interval outside the range covers nothing
+        ([1, 2], (11, 12), [(3, 6)]),  # stored months, interval after the range
+    ],
+)
+def test_plan_missing_ranges(stored, covered, ranges):
+    project_state = state(*covered) if covered else None
+    planned = plan_missing_ranges(
+        m(1), m(6), {m(month) for month in stored}, project_state
+    )
+    assert planned == [(m(first), m(last)) for first, last in ranges]
+
+
+# --- Recorded interval ---
+@pytest.mark.parametrize(
+    "previous, desired, interval",
+    [
+        (None, (4, 6), (4, 6)),
+        ((1, 6), (3, 4), (1, 6)),  # inside the old interval
+        ((1, 4), (3, 6), (1, 6)),  # overlapping
+        ((1, 3), (4, 6), (1, 6)),  # adjacent, after
+        ((4, 6), (1, 3), (1, 6)),  # adjacent, before
+        ((1, 3), (5, 6), (5, 6)),  # April never fetched: old interval dropped
+        ((8, 9), (1, 3), (1, 3)),
+    ],
+)
+def test_completed_state(previous, desired, interval):
+    project_state = state(*previous) if previous else None
+    assert completed_state(project_state, m(desired[0]), m(desired[1])) == (
+        m(interval[0]),
+        m(interval[1]),
+    )
+
+
+def test_completed_state_of_a_state_without_interval():
+    never_fetched = {"first_month": None, "last_month": None, "status": "failed"}
+    assert completed_state(never_fetched, m(1), m(2)) == (m(1), m(2))
@@ -0,0 +1,171 @@
+"""
+Parity of the prefix-sum detector with the original per-row window scan.
+
+    python -m pytest tests
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from peak_detection import (
+    DEFAULT_THRESHOLD,
+    find_peaks_all_projects,
+    find_peaks_rolling_3_years,
+    is_peak,
+    rolling_3_year_stats,
+    rolling_3_year_stats_all_projects,
+)
+
+STAT_COLUMNS = ["rolling_mean", "threshold", "percentage_difference"]
+
+
+# --- Reference: the original per-row scan of community_alerts.py ---
+def reference_stats(df, threshold_percentage=DEFAULT_THRESHOLD):
+    df = df.sort_values("timestamp").reset_index(drop=True)
+    rows = []
+    for i in range(len(df)):
+        t_i = df.at[i, "timestamp"]
+        edits_i = df.at[i, "edit_count"]
+        window = df[
+            (df["timestamp"] >= t_i - pd.DateOffset(years=3)) & (df["timestamp"] <= t_i)
+        ]
+        rolling_mean = window["edit_count"].mean()
+        threshold = rolling_mean * (1 + threshold_percentage)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pct_diff = ((edits_i - rolling_mean) / rolling_mean) * 100
+        rows.append((t_i, edits_i, rolling_mean, threshold, pct_diff))
+    return pd.DataFrame(rows, columns=["timestamp", "edit_count"] + STAT_COLUMNS)
+
+
+def reference_peaks(df, threshold_percentage=DEFAULT_THRESHOLD):
+    stats = reference_stats(df, threshold_percentage)
+    return stats[stats["edit_count"] >= stats["threshold"]].reset_index(drop=True)
+
+
+# --- Random series ---
+def random_series(rng, length, freq):
+    """`length` points of one project, with gaps, zero runs and spikes."""
+    if length == 0:
+        timestamps = pd.DatetimeIndex([], tz="UTC")
+    else:
+        # Starting on Feb 29 exercises the calendar-year window boundary
+        start = pd.Timestamp("2012-02-29", tz="UTC")
+        steps = rng.integers(1, 3, size=length).cumsum() - 1
+        timestamps = pd.date_range(start, periods=steps[-1] + 1, freq=freq)[steps]
+    kind = rng.integers(3)
+    if kind == 0:
+        counts = np.zeros(length, dtype=np.int64)
+    else:
+        counts = rng.poisson(rng.uniform(1, 500), size=length)
+        counts[rng.random(length) < 0.2] = 0
+        spikes = rng.random(length) < 0.05
+        counts[spikes] *= rng.integers(2, 10, size=spikes.sum())
+    frame = pd.DataFrame({"timestamp": timestamps, "edit_count": counts})
+    # Source rows are not stored in timestamp order
+    return frame.iloc[rng.permutation(length)].reset_index(drop=True)
+
+
+def random_projects(seed, projects, freq="MS"):
+    rng = np.random.default_rng(seed)
+    lengths = [0, 1, 2, 3] + list(rng.integers(0, 80, size=projects - 4))
+    frames = [
+        random_series(rng, length, freq).assign(project=f"p{i}.example.org")
+        for i, length in enumerate(lengths)
+    ]
+    return pd.concat(frames, ignore_index=True)
+
+
+def assert_stats_equal(actual, expected):
+    assert list(actual["timestamp"]) == list(expected["timestamp"])
+    np.testing.assert_array_equal(actual["edit_count"], expected["edit_count"])
+    for column in STAT_COLUMNS:
+        np.testing.assert_array_equal(
+            actual[column].to_numpy(), expected[column].to_numpy(), err_msg=column
+        )
+
+
+# --- Single project ---
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("freq", ["MS", "7D"])
+def test_single_project_matches_reference(seed, freq):
+    df = random_projects(seed, 12, freq)
+    for _, series in df.groupby("project"):
+        series = series[["timestamp", "edit_count"]]
+        assert_stats_equal(rolling_3_year_stats(series), reference_stats(series))
+
+        peaks = pd.DataFrame(
+            find_peaks_rolling_3_years(series),
+            columns=["timestamp", "edit_count"] + STAT_COLUMNS,
+        )
+        assert_stats_equal(peaks, reference_peaks(series))
+
+
+@pytest.mark.parametrize("length", [0, 1, 2])
+def test_short_series(length):
+    series = random_series(np.random.default_rng(length), length, "MS")
+    stats = rolling_3_year_stats(series)
+    assert len(stats) == length
+    assert_stats_equal(stats, reference_stats(series))
+
+
+def test_zero_series_has_no_score():
+    series = pd.DataFrame(
+        {
+            "timestamp": pd.date_range("2020-01-01", periods=6, freq="MS", tz="UTC"),
+            "edit_count": np.zeros(6, dtype=np.int64),
+        }
+    )
+    stats = rolling_3_year_stats(series)
+    assert_stats_equal(stats, reference_stats(series))
+    assert stats["score"].isna().all()
+
+
+# --- All projects at once ---
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("freq", ["MS", "7D"])
+def test_all_projects_match_reference(seed, freq):
+    df = random_projects(seed, 20, freq)
+    stats = rolling_3_year_stats_all_projects(df)
+    peaks = find_peaks_all_projects(df)
+    assert len(stats) == len(df)
+    for project, series in df.groupby("project"):
+        series = series[["timestamp", "edit_count"]]
+        assert_stats_equal(
+            stats[stats["project"] == project].reset_index(drop=True),
+            reference_stats(series),
+        )
+        assert_stats_equal(
+            peaks[peaks["project"] == project].reset_index(drop=True),
+            reference_peaks(series),
+        )
+
+
+def test_all_projects_empty():
+    df = random_projects(0, 4).iloc[:0]
+    assert rolling_3_year_stats_all_projects(df).empty
+    assert find_peaks_all_projects(df).empty
+
+
+# --- Stored peak definition ---
+def test_is_peak_is_the_score_filter_without_zero_windows():
+    df = random_projects(0, 20)
+    stats = rolling_3_year_stats_all_projects(df)
+    peaks = is_peak(stats)
+    # What /api/peaks and the digest select in SQL
+    np.testing.assert_array_equal(peaks, (stats["score"] >= 1.3).to_numpy())
+    assert not peaks[stats["rolling_mean"] == 0].any()
+    assert peaks[stats["rolling_mean"] > 0].sum() > 0
+
+
+def test_all_zero_window_is_no_stored_peak():
+    series = pd.DataFrame(
+        {
+            "timestamp": pd.date_range("2020-01-01", periods=4, freq="MS", tz="UTC"),
+            "edit_count": [0, 0, 0, 40],
+        }
+    )
+    stats = rolling_3_year_stats(series)
+    # The reference loop counts 0 >= 0 as a peak; the stored definition does not
+    assert len(reference_peaks(series)) == 4
+    assert is_peak(stats).tolist() == [False, False, False, True]
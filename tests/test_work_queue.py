@@ -0,0 +1,99 @@
+"""
+Leases of work_queue.py on a temporary SQLite queue.
+
+    python -m pytest tests
+"""
+
+from datetime import date
+
+import pytest
+
+from work_queue import WorkItem, WorkQueue, connect
+
+MONTH = date(2024, 1, 1)
+EXPIRED = -1  # lease_seconds of a lease that has already run out
+
+
+def item(project):
+    return WorkItem(project, MONTH, MONTH)
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = WorkQueue(connect(str(tmp_path / "queue.sqlite")), max_attempts=2)
+    queue.ensure_table()
+    return queue
+
+
+def projects(items):
+    return [item.project for item in items]
+
+
+# --- Claims ---
+def test_claims_follow_enqueue_order(queue):
+    order = ["zz.busy.org", "mm.active.org", "aa.quiet.org", "bb.dormant.org"]
+    assert queue.enqueue(item(project) for project in order) == 4
+    assert projects(queue.claim("a", 3)) == order[:3]
+    assert projects(queue.claim("b", 3)) == order[3:]
+    assert queue.claim("c", 3) == []
+
+
+def test_enqueue_leaves_queued_items_alone(queue):
+    queue.enqueue([item("a.org")])
+    queue.complete("w", queue.claim("w"))
+    assert queue.enqueue([item("a.org"), item("b.org")]) == 1
+    assert projects(queue.claim("w")) == ["b.org"]
+
+
+def test_expired_lease_is_reclaimed(queue):
+    queue.enqueue([item("a.org"), item("b.org")])
+    assert projects(queue.claim("dead", 1, EXPIRED)) == ["a.org"]
+    # The expired lease is handed out again, still in priority order
+    assert projects(queue.claim("live", 1)) == ["a.org"]
+    assert projects(queue.claim("other", 2)) == ["b.org"]
+    # Live leases are not
+    assert queue.claim("late", 2) == []
+    assert queue.counts() == {"leased": 2}
+
+
+def test_heartbeat_keeps_leases(queue):
+    queue.enqueue([item("a.org")])
+    queue.claim("w", 1, EXPIRED)
+    assert queue.heartbeat("w") == 1
+    assert queue.claim("other") == []
+
+
+# --- Attempts ---
+def test_item_fails_after_max_attempts_of_expired_leases(queue):
+    queue.enqueue([item("a.org")])
+    assert projects(queue.claim("w1", 1, EXPIRED)) == ["a.org"]
+    assert projects(queue.claim("w2", 1, EXPIRED)) == ["a.org"]
+    # Two leases expired: given up on instead of leased a third time
+    assert queue.claim("w3") == []
+    assert queue.counts() == {"failed": 1}
+
+
+def test_failed_item_is_retried_until_max_attempts(queue):
+    queue.enqueue([item("a.org")])
+    assert queue.fail("w", queue.claim("w"), "HTTP 500") == 1
+    assert queue.counts() == {"pending": 1}
+    assert queue.fail("w", queue.claim("w"), "HTTP 500") == 1
+    assert queue.counts() == {"failed": 1}
+    assert queue.claim("w") == []
+
+
+# --- Lost ownership ---
+def test_complete_and_fail_ignored_after_losing_the_lease(queue):
+    queue.enqueue([item("a.org")])
+    stale = queue.claim("slow", 1, EXPIRED)
+    fresh = queue.claim("fast", 1)
+    assert projects(fresh) == ["a.org"]
+
+    # The first worker's results no longer apply
+    assert queue.complete("slow", stale) == 0
+    assert queue.fail("slow", stale, "timeout") == 0
+    assert queue.heartbeat("slow") == 0
+    assert queue.counts() == {"leased": 1}
+
+    assert queue.complete("fast", fresh) == 1
+    assert queue.counts() == {"done": 1}
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+
+import argparse
+import logging
+import os
+import socket
+import sqlite3
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+import pymysql
+
+from db import DB_HOST, DB_NAME, load_credentials
+
+QUEUE_TABLE = "fetch_queue"
+DEFAULT_CLAIM_SIZE = 50  # projects per claim
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_KEEP_DAYS = 90  # finished items kept, so re-enqueueing is a no-op
+
+WorkItem = namedtuple("WorkItem", ["project", "first_month", "last_month"])
+
+
+def worker_id():
+    """Lease owner name of this process, unique across nodes."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def connect(sqlite_path=None):
+    """
+    Queue connection: the ToolsDB database by default, or a local SQLite
+    file standing in for it (for tests and local multi-process runs).
+    """
+    if sqlite_path:
+        conn = sqlite3.connect(
+            sqlite_path, timeout=60, isolation_level=None, check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+    user, password = load_credentials()
+    return pymysql.connect(
+        host=DB_HOST,
+        user=user,
+        password=password,
+        database=DB_NAME,
+        charset="utf8mb4",
+        autocommit=True,
+    )
+
+
+def _timestamp(dt):
+    return dt.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _date(value):
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+def _key(item):
+    """Primary key values of an item, with months as ISO strings for both drivers."""
+    return item.project, item.first_month.isoformat(), item.last_month.isoformat()
+
+
+class WorkQueue:
+    """
+    Lease-based queue of (project, month range) fetch items in a table.
+
+    `claim` leases up to `claim_size` items to a worker for `lease_seconds`:
+    pending ones, and leased ones whose lease expired because their worker
+    died, in the order they were enqueued in. On MySQL/MariaDB the candidate rows are locked with
+    `SELECT ... FOR UPDATE SKIP LOCKED`, so concurrent claims skip each
+    other's rows instead of waiting or double-claiming; on SQLite,
+    `BEGIN IMMEDIATE` serializes claims. Workers extend their leases with
+    `heartbeat` and finish items with `complete` or `fail`. Those updates
+    only apply while the worker still owns the lease, so a worker that lost
+    its items to a reclaim cannot overwrite its successor's result.
+
+    An item that has been leased `max_attempts` times without completing is
+    marked failed instead of being handed out again.
+    """
+
+    def __init__(self, conn, table=QUEUE_TABLE, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.conn = conn
+        self.table = table
+        self.max_attempts = max_attempts
+        self.sqlite = isinstance(conn, sqlite3.Connection)
+        self.lock = threading.Lock()  # the heartbeat thread shares the connection
+
+    # --- Plumbing for both dialects ---
+    def _sql(self, query):
+        return query.replace("%s", "?") if self.sqlite else query
+
+    @contextmanager
+    def _transaction(self):
+        with self.lock:
+            if self.sqlite:
+                cursor = self.conn.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
+            else:
+                self.conn.begin()
+                cursor = self.conn.cursor()
+            try:
+                yield cursor
+            except Exception:
+                if self.sqlite:
+                    cursor.execute("ROLLBACK")
+                else:
+                    self.conn.rollback()
+                raise
+            else:
+                if self.sqlite:
+                    cursor.execute("COMMIT")
+                else:
+                    self.conn.commit()
+            finally:
+                cursor.close()
+
+    def ensure_table(self):
+        # SQLite has no inline KEY clause; its index is created below
+        index = "" if self.sqlite else ", KEY status_lease (status, lease_expires)"
+        with self._transaction() as cursor:
+            cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                project VARCHAR(255),
+                first_month DATE,
+                last_month DATE,
+                status VARCHAR(16),
+                lease_owner VARCHAR(255),
+                lease_expires DATETIME,
+                attempts INT,
+                error TEXT,
+                updated_at DATETIME,
+                priority INT,
+                PRIMARY KEY (project, first_month, last_month){index}
+            )
+            """)
+            # Tables created before items had priorities
+            if self.sqlite:
+                cursor.execute(f"PRAGMA table_info({self.table})")
+                if "priority" not in {row[1] for row in cursor.fetchall()}:
+                    cursor.execute(f"ALTER TABLE {self.table} ADD COLUMN priority INT")
+                cursor.execute(
+                    f"CREATE INDEX IF NOT EXISTS {self.table}_status_lease "
+                    f"ON {self.table} (status, lease_expires)"
+                )
+            else:
+                cursor.execute(
+                    f"ALTER TABLE {self.table} ADD COLUMN IF NOT EXISTS priority INT"
+                )
+
+    # --- Producers ---
+    def enqueue(self, items):
+        """
+        Add `items` as pending, to be claimed in the given order (e.g. the
+        scheduler's busiest-first fetch order). Items already queued, in any
+        state, are left alone, so every worker of a run may enqueue the same
+        plan. Returns the number of new items.
+        """
+        now = _timestamp(datetime.utcnow())
+        rows = [
+            (*_key(item), "pending", 0, "", now, priority)
+            for priority, item in enumerate(items)
+        ]
+        if not rows:
+            return 0
+        insert = "INSERT OR IGNORE" if self.sqlite else "INSERT IGNORE"
+        with self._transaction() as cursor:
+            cursor.executemany(
+                self._sql(f"""
+                {insert} INTO {self.table}
+                    (project, first_month, last_month, status, attempts, error,
+                     updated_at, priority)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                """),
+                rows,
+            )
+            return cursor.rowcount
+
+    # --- Workers ---
+    def claim(
+        self, owner, claim_size=DEFAULT_CLAIM_SIZE, lease_seconds=DEFAULT_LEASE_SECONDS
+    ):
+        """Lease up to `claim_size` items to `owner`; an empty list when none are left."""
+        now = datetime.utcnow()
+        with self._transaction() as cursor:
+            # Items whose workers kept dying with them are given up on
+            cursor.execute(
+                self._sql(f"""
+                UPDATE {self.table}
+                SET status = 'failed', lease_owner = NULL, lease_expires = NULL,
+                    error = 'lease expired too often', updated_at = %s
+                WHERE status = 'leased' AND lease_expires < %s AND attempts >= %s
+                """),
+                (_timestamp(now), _timestamp(now), self.max_attempts),
+            )
+            cursor.execute(
+                self._sql(f"""
+                SELECT project, first_month, last_month FROM {self.table}
+                WHERE status = 'pending'
+                   OR (status = 'leased' AND lease_expires < %s)
+                ORDER BY priority
+                LIMIT %s
+                {"" if self.sqlite else "FOR UPDATE SKIP LOCKED"}
+                """),
+                (_timestamp(now), claim_size),
+            )
+            items = [
+                WorkItem(project, _date(first), _date(last))
+                for project, first, last in cursor.fetchall()
+            ]
+            if items:
+                expires = _timestamp(now + timedelta(seconds=lease_seconds))
+                cursor.executemany(
+                    self._sql(f"""
+                    UPDATE {self.table}
+                    SET status = 'leased', lease_owner = %s, lease_expires = %s,
+                        attempts = attempts + 1, updated_at = %s
+                    WHERE project = %s AND first_month = %s AND last_month = %s
+                    """),
+                    [(owner, expires, _timestamp(now), *_key(item)) for item in items],
+                )
+        return items
+
+    def heartbeat(self, owner, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Extend every lease `owner` holds. Returns the number still held."""
+        now = datetime.utcnow()
+        with self._transaction() as cursor:
+            cursor.execute(
+                self._sql(f"""
+                UPDATE {self.table}
+                SET lease_expires = %s, updated_at = %s
+                WHERE status = 'leased' AND lease_owner = %s
+                """),
+                (
+                    _timestamp(now + timedelta(seconds=lease_seconds)),
+                    _timestamp(now),
+                    owner,
+                ),
+            )
+            return cursor.rowcount
+
+    @contextmanager
+    def keep_alive(self, owner, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Heartbeat `owner`'s leases from a background thread while the block runs."""
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(lease_seconds / 3):
+                try:
+                    self.heartbeat(owner, lease_seconds)
+                except Exception as e:
+                    logging.warning(f"Lease heartbeat of {owner} failed: {e}")
+
+        thread = threading.Thread(target=beat, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def complete(self, owner, items):
+        """Mark `items` done. Returns how many `owner` still held."""
+        return self._finish(owner, items, "'done'", "")
+
+    def fail(self, owner, items, error):
+        """Return `items` to the queue, or mark them failed after `max_attempts`."""
+        status = f"CASE WHEN attempts >= {int(self.max_attempts)} THEN 'failed' ELSE 'pending' END"
+        return self._finish(owner, items, status, error[:1000])
+
+    def _finish(self, owner, items, status, error):
+        if not items:
+            return 0
+        now = _timestamp(datetime.utcnow())
+        with self._transaction() as cursor:
+            cursor.executemany(
+                self._sql(f"""
+                UPDATE {self.table}
+                SET status = {status}, lease_owner = NULL, lease_expires = NULL,
+                    error = %s, updated_at = %s
+                WHERE project = %s AND first_month = %s AND last_month = %s
+                  AND status = 'leased' AND lease_owner = %s
+                """),
+                [(error, now, *_key(item), owner) for item in items],
+            )
+            held = cursor.rowcount
+        if held < len(items):
+            logging.warning(
+                f"{owner} lost the lease of {len(items) - held} items to another worker"
+            )
+        return held
+
+    # --- Maintenance ---
+    def counts(self):
+        with self._transaction() as cursor:
+            cursor.execute(f"SELECT status, COUNT(*) FROM {self.table} GROUP BY status")
+            return dict(cursor.fetchall())
+
+    def prune(self, keep_days=DEFAULT_KEEP_DAYS):
+        """Delete items finished more than `keep_days` ago."""
+        cutoff = _timestamp(datetime.utcnow() - timedelta(days=keep_days))
+        with self._transaction() as cursor:
+            cursor.execute(
+                self._sql(f"""
+                DELETE FROM {self.table}
+                WHERE status IN ('done', 'failed') AND updated_at < %s
+                """),
+                (cutoff,),
+            )
+            return cursor.rowcount
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    parser = argparse.ArgumentParser(
+        description="Show the fetch work queue, or prune finished items."
+    )
+    parser.add_argument(
+        "--sqlite", metavar="PATH", help="Use a local SQLite queue instead of ToolsDB."
+    )
+    parser.add_argument(
+        "--prune",
+        type=int,
+        metavar="DAYS",
+        help="Delete items finished more than DAYS days ago.",
+    )
+    args = parser.parse_args()
+    queue = WorkQueue(connect(args.sqlite))
+    queue.ensure_table()
+    if args.prune is not None:
+        logging.info(f"Pruned {queue.prune(args.prune)} finished items")
+    for status, count in sorted(queue.counts().items()):
+        print(f"{status}: {count}")